@@ -0,0 +1,198 @@
+"""
+Deterministic local stand-ins for the network services and HF models StudyMate talks to.
+Every fake takes a latency (seconds) so benchmarks can model a realistic upstream.
+"""
+import json
+import time
+import asyncio
+import hashlib
+from types import SimpleNamespace
+from mistralai.models import AssistantMessage, ToolCall, FunctionCall
+from utils import message_role
+
+
+# === Mistral chat client ===
+def tool_turn(*calls):
+    """A scripted model turn that requests tools: tool_turn(("summarize_pdf", {"pdf_path": "a.pdf"}), ...)."""
+    return {"tool_calls": list(calls)}
+
+
+def reply_turn(content):
+    return {"content": content}
+
+
+class _FakeChat:
+    def __init__(self, script, latency, tokens_per_second):
+        self.script = script
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.calls = 0
+
+    def _turn(self, messages):
+        # Stateless: the turn is chosen by how many assistant messages the conversation already has,
+        # so one client can serve any number of concurrent conversations
+        index = sum(1 for m in messages if message_role(m) == "assistant")
+        return self.script[min(index, len(self.script) - 1)]
+
+    def _response(self, messages):
+        self.calls += 1
+        turn = self._turn(messages)
+        prompt_tokens = len(json.dumps(messages, default=str)) // 4
+        if "tool_calls" in turn:
+            tool_calls = [
+                ToolCall(
+                    id=hashlib.sha1(f"{self.calls}-{i}-{name}".encode()).hexdigest()[:9],
+                    index=i,
+                    function=FunctionCall(name=name, arguments=json.dumps(arguments)),
+                )
+                for i, (name, arguments) in enumerate(turn["tool_calls"])
+            ]
+            message = AssistantMessage(content="", tool_calls=tool_calls)
+            finish_reason, completion_tokens = "tool_calls", 20 * len(tool_calls)
+        else:
+            message = AssistantMessage(content=turn["content"])
+            finish_reason, completion_tokens = "stop", len(turn["content"].split())
+        usage = SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+        )
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason=finish_reason)], usage=usage)
+
+    def _generation_seconds(self, response):
+        if not self.tokens_per_second:
+            return 0.0
+        return response.usage.completion_tokens / self.tokens_per_second
+
+    def complete(self, messages, **kwargs):
+        response = self._response(messages)
+        time.sleep(self.latency + self._generation_seconds(response))
+        return response
+
+    async def complete_async(self, messages, **kwargs):
+        response = self._response(messages)
+        await asyncio.sleep(self.latency + self._generation_seconds(response))
+        return response
+
+    async def stream_async(self, messages, **kwargs):
+        response = self._response(messages)
+        await asyncio.sleep(self.latency)
+        choice = response.choices[0]
+        per_token = 1 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+        def chunk(content=None, tool_calls=None, finish_reason=None):
+            delta = SimpleNamespace(content=content, tool_calls=tool_calls)
+            return SimpleNamespace(data=SimpleNamespace(
+                choices=[SimpleNamespace(delta=delta, finish_reason=finish_reason)],
+                usage=response.usage if finish_reason else None,
+            ))
+
+        async def events():
+            if choice.message.tool_calls:
+                yield chunk(tool_calls=choice.message.tool_calls, finish_reason=choice.finish_reason)
+                return
+            words = choice.message.content.split(" ")
+            for i, word in enumerate(words):
+                await asyncio.sleep(per_token)
+                last = i == len(words) - 1
+                yield chunk(content=word + ("" if last else " "), finish_reason=choice.finish_reason if last else None)
+
+        return events()
+
+
+class FakeMistral:
+    """
+    Drop-in for mistralai.Mistral with a scripted sequence of turns, e.g.
+    FakeMistral([tool_turn(("summarize_pdf", {"pdf_path": path})), reply_turn("Here is the summary.")]).
+    """
+
+    def __init__(self, script, latency=0.3, tokens_per_second=0):
+        self.chat = _FakeChat(script, latency, tokens_per_second)
+
+
+# === Translator ===
+class FakeTranslator:
+    """Translator backend for translation.set_translator_backend(): tags the text with the target language."""
+
+    def __init__(self, latency=0.2):
+        self.latency = latency
+        self.calls = 0
+
+    def __call__(self, text, target):
+        self.calls += 1
+        time.sleep(self.latency)
+        return f"[{target}] {text}"
+
+
+# === SerpAPI ===
+class FakeGoogleSearch:
+    """Same interface as serpapi.GoogleSearch: GoogleSearch(params).get_dict()."""
+
+    latency = 0.5
+
+    def __init__(self, params):
+        self.params = params
+
+    def get_dict(self):
+        time.sleep(self.latency)
+        seed = hashlib.sha1(self.params.get("q", "").encode()).hexdigest()[:6]
+        return {
+            "organic_results": [
+                {
+                    "title": f"Related work {seed}-{i}",
+                    "publication_info": {"summary": f"A. Author, B. Author - Journal {i}, 2024"},
+                    "link": f"https://example.org/{seed}/{i}",
+                }
+                for i in range(10)
+            ]
+        }
+
+
+def fake_search_backend(latency=0.5):
+    """Backend for tools.set_search_backend()."""
+    FakeGoogleSearch.latency = latency
+    return lambda params: FakeGoogleSearch(params).get_dict()
+
+
+# === HF pipelines ===
+class FakeTokenizer:
+    model_max_length = 1024
+
+    def encode(self, text, add_special_tokens=False):
+        return text.split()
+
+    def decode(self, ids, skip_special_tokens=True):
+        return " ".join(ids)
+
+
+class FakeSummarizer:
+    """Summarization pipeline stand-in whose cost grows with the number of input tokens."""
+
+    def __init__(self, seconds_per_1k_tokens=0.05):
+        self.tokenizer = FakeTokenizer()
+        self.seconds_per_1k_tokens = seconds_per_1k_tokens
+
+    def __call__(self, texts, max_length=142, min_length=0, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else texts
+        time.sleep(sum(len(t.split()) for t in texts) / 1000 * self.seconds_per_1k_tokens)
+        outputs = [{"summary_text": " ".join(t.split()[:max(min_length, min(max_length, len(t.split()) // 4))])} for t in texts]
+        return outputs
+
+
+class FakeTextGen:
+    def __init__(self, seconds_per_call=0.2):
+        self.tokenizer = FakeTokenizer()
+        self.seconds_per_call = seconds_per_call
+
+    def __call__(self, prompt, max_new_tokens=256, **kwargs):
+        # Like the pipeline: a list of prompts is one batched call returning one output list per prompt
+        time.sleep(self.seconds_per_call)
+        if isinstance(prompt, list):
+            return [[{"generated_text": p + " A short generated answer."}] for p in prompt]
+        return [{"generated_text": prompt + " A short generated answer."}]
+
+
+def install_fake_models(model_registry, summarizer_seconds_per_1k_tokens=0.05, textgen_seconds_per_call=0.2):
+    model_registry.register("summarizer", lambda: FakeSummarizer(summarizer_seconds_per_1k_tokens))
+    model_registry.register("textgen", lambda: FakeTextGen(textgen_seconds_per_call))
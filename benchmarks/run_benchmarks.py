@@ -0,0 +1,323 @@
+"""
+Offline benchmark suite for the StudyMate tools and agent loop.
+
+Mistral, the Google translator, SerpAPI and (by default) the HF pipelines are replaced by the
+deterministic stand-ins in fakes.py, so no API keys or network are needed. Every
+(scenario, PDF size) pair runs in its own process so peak RSS is per scenario.
+
+    python benchmarks/run_benchmarks.py --sizes 1 10 100 500 --iterations 5 --output bench.json
+    python benchmarks/run_benchmarks.py --scenarios agent_loop translate_pdf --mistral-latency 0.8
+    python benchmarks/run_benchmarks.py --scenarios routed_prompt agent_loop --fast-path
+    python benchmarks/run_benchmarks.py --scenarios summarize_pdf answering_pdf --real-models --backends torch int8 onnx
+
+The JSON report holds, per run: p50/p95/mean latency, throughput and peak RSS. With several
+--backends, "comparison" gives each backend's speedup and RSS saving against the first one.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import statistics
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "studymate_agent"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+RESULT_MARKER = "__BENCH_RESULT__"
+QUESTION = "What are the results on accuracy and latency?"
+
+# Scenarios that don't depend on the PDF size run once, on the smallest document
+SIZE_INDEPENDENT = {"search_similar"}
+
+
+# === Scenarios ===
+# Each builder gets the run configuration and returns (setup, operation); setup runs before every
+# iteration outside the timed region.
+def _tools_for_agent():
+    from utils import build_tool_schema, build_function_map_with_partial
+    from tools import (
+        translate_text, translate_pdf, answering_text, answering_pdf,
+        abstract_from_text, abstract_from_pdf, search_similar,
+        summarize_text, summarize_pdf
+    )
+    tools = [
+        translate_text, translate_pdf, answering_text, answering_pdf,
+        abstract_from_text, abstract_from_pdf, search_similar,
+        summarize_text, summarize_pdf
+    ]
+    return [build_tool_schema(fn) for fn in tools], build_function_map_with_partial(tools)
+
+
+def scenario_parse_cold(config):
+    from doc_store import doc_store
+    from tools import extract_text_from_pdf
+    return doc_store.clear, lambda: extract_text_from_pdf(config["pdf"])
+
+
+def scenario_parse_warm(config):
+    from tools import extract_text_from_pdf
+    extract_text_from_pdf(config["pdf"])
+    return None, lambda: extract_text_from_pdf(config["pdf"])
+
+
+def scenario_abstract_from_pdf(config):
+    from tools import abstract_from_pdf
+    return None, lambda: abstract_from_pdf(config["pdf"])
+
+
+def scenario_answering_pdf(config):
+    from tools import answering_pdf
+    return None, lambda: answering_pdf(config["pdf"], QUESTION)
+
+
+def scenario_summarize_pdf(config):
+    from tools import summarize_pdf
+    return None, lambda: summarize_pdf(config["pdf"])
+
+
+def scenario_translate_pdf(config):
+    from tools import translate_pdf
+    from translation import translation_cache
+
+    def reset():
+        if not config["warm_caches"]:
+            translation_cache._entries.clear()
+    return reset, lambda: translate_pdf(config["pdf"], "german")
+
+
+def scenario_search_similar(config):
+    from tools import search_similar
+    from search_cache import search_cache
+
+    def reset():
+        if not config["warm_caches"]:
+            search_cache.clear()
+    return reset, lambda: search_similar("A synthetic study of efficient document understanding.", "Synthetic Study")
+
+
+def _agent_scenario(config, script):
+    from agent_loop import agent_loop
+    from fakes import FakeMistral
+    schemas, functions = _tools_for_agent()
+    client = FakeMistral(script, latency=config["mistral_latency"], tokens_per_second=config["mistral_tokens_per_second"])
+    conversation = [{"role": "user", "content": "Summarize this paper and find similar papers."}]
+    return None, lambda: agent_loop(conversation, schemas, 5, functions, client=client, model="fake-mistral")
+
+
+def scenario_agent_loop(config):
+    from fakes import tool_turn, reply_turn
+    return _agent_scenario(config, [
+        tool_turn(("summarize_pdf", {"pdf_path": config["pdf"]})),
+        tool_turn(("abstract_from_pdf", {"filepath": config["pdf"]})),
+        tool_turn(("search_similar", {"abstract": "efficient document understanding"})),
+        reply_turn("Here is the summary and a list of similar papers."),
+    ])
+
+
+def scenario_agent_loop_parallel(config):
+    from fakes import tool_turn, reply_turn
+    return _agent_scenario(config, [
+        tool_turn(
+            ("summarize_pdf", {"pdf_path": config["pdf"]}),
+            ("abstract_from_pdf", {"filepath": config["pdf"]}),
+            ("search_similar", {"abstract": "efficient document understanding"}),
+        ),
+        reply_turn("Here is the summary and a list of similar papers."),
+    ])
+
+
+def scenario_run_prompt(config):
+    from run_prompt import run_prompt
+    from model_registry import run_classic_prompt
+    from fakes import FakeMistral, tool_turn, reply_turn
+    client = FakeMistral([
+        tool_turn(("answering_pdf", {"filepath": config["pdf"], "question": QUESTION})),
+        reply_turn("The results show improved accuracy at lower latency."),
+    ], latency=config["mistral_latency"], tokens_per_second=config["mistral_tokens_per_second"])
+    conversation = [{"role": "user", "content": QUESTION}]
+    return None, lambda: run_prompt(conversation, run_classic_prompt, client, "fake-mistral")
+
+
+def scenario_routed_prompt(config):
+    from run_prompt import run_prompt
+    from model_registry import run_classic_prompt
+    from fakes import FakeMistral, tool_turn, reply_turn
+    client = FakeMistral([
+        tool_turn(("summarize_pdf", {"pdf_path": config["pdf"]})),
+        reply_turn("Here is the summary."),
+    ], latency=config["mistral_latency"], tokens_per_second=config["mistral_tokens_per_second"])
+    conversation = [{"role": "user", "content": f'Summarize this paper. The file is called "{config["pdf"]}".'}]
+    return None, lambda: run_prompt(conversation, run_classic_prompt, client, "fake-mistral")
+
+
+SCENARIOS = {
+    name[len("scenario_"):]: fn for name, fn in globals().items() if name.startswith("scenario_")
+}
+
+
+# === Worker: one scenario in this process ===
+def _install_fakes(config):
+    from fakes import FakeTranslator, fake_search_backend, install_fake_models
+    from translation import set_translator_backend
+    from tools import set_search_backend
+    from model_registry import model_registry
+
+    set_translator_backend(FakeTranslator(config["translator_latency"]))
+    set_search_backend(fake_search_backend(config["search_latency"]))
+    if not config["real_models"]:
+        install_fake_models(model_registry)
+
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_worker(config):
+    _install_fakes(config)
+    setup, operation = SCENARIOS[config["scenario"]](config)
+
+    # One untimed run loads models and warms imports
+    if setup:
+        setup()
+    operation()
+
+    latencies = []
+
+    def timed():
+        if setup:
+            setup()
+        start = time.perf_counter()
+        operation()
+        latencies.append(time.perf_counter() - start)
+
+    wall_start = time.perf_counter()
+    if config["concurrency"] > 1:
+        with ThreadPoolExecutor(max_workers=config["concurrency"]) as pool:
+            list(pool.map(lambda _: timed(), range(config["iterations"])))
+    else:
+        for _ in range(config["iterations"]):
+            timed()
+    wall = time.perf_counter() - wall_start
+
+    return {
+        "scenario": config["scenario"],
+        "pages": config["pages"],
+        "backend": config["backend"],
+        "iterations": config["iterations"],
+        "concurrency": config["concurrency"],
+        "p50_s": round(_percentile(latencies, 50), 4),
+        "p95_s": round(_percentile(latencies, 95), 4),
+        "mean_s": round(statistics.mean(latencies), 4),
+        "throughput_per_s": round(config["iterations"] / wall, 3) if wall else None,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def _compare_backends(results, baseline):
+    """Speedup (baseline p50 / p50) and peak RSS saving of every backend run against the baseline's."""
+    base_runs = {(r["scenario"], r["pages"]): r for r in results if r.get("backend") == baseline and "error" not in r}
+    comparison = []
+    for r in results:
+        base = base_runs.get((r["scenario"], r["pages"]))
+        if r.get("backend") == baseline or base is None or "error" in r:
+            continue
+        comparison.append({
+            "scenario": r["scenario"],
+            "pages": r["pages"],
+            "backend": r["backend"],
+            "speedup_p50": round(base["p50_s"] / r["p50_s"], 2) if r["p50_s"] else None,
+            "rss_saved_mb": round(base["peak_rss_mb"] - r["peak_rss_mb"], 1),
+        })
+    return comparison
+
+
+# === Driver ===
+def main():
+    parser = argparse.ArgumentParser(description="StudyMate offline benchmarks")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1, 10, 100, 500], help="Synthetic PDF page counts.")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=1, help="Iterations run at once (threads).")
+    parser.add_argument("--mistral-latency", type=float, default=0.3)
+    parser.add_argument("--mistral-tokens-per-second", type=float, default=0)
+    parser.add_argument("--translator-latency", type=float, default=0.2)
+    parser.add_argument("--search-latency", type=float, default=0.5)
+    parser.add_argument("--real-models", action="store_true", help="Use the real HF pipelines instead of fakes.")
+    parser.add_argument(
+        "--backends", nargs="+", choices=["torch", "int8", "onnx"], default=["torch"],
+        help="Inference backends to compare (with --real-models); the first one is the baseline.",
+    )
+    parser.add_argument("--warm-caches", action="store_true", help="Keep translation and search caches between iterations.")
+    parser.add_argument("--fast-path", action="store_true", help="Enable the local intent router and return-direct tools.")
+    parser.add_argument("--pdf-dir", default=os.path.join(tempfile.gettempdir(), "studymate_bench_pdfs"))
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file.")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(RESULT_MARKER + json.dumps(run_worker(json.loads(args.worker))))
+        return
+    if len(args.backends) > 1 and not args.real_models:
+        parser.error("--backends only changes the real HF models; add --real-models to compare them")
+
+    from synthetic_pdfs import ensure_pdfs
+    pdfs = ensure_pdfs(args.sizes, args.pdf_dir)
+
+    base = {
+        "iterations": args.iterations,
+        "concurrency": args.concurrency,
+        "mistral_latency": args.mistral_latency,
+        "mistral_tokens_per_second": args.mistral_tokens_per_second,
+        "translator_latency": args.translator_latency,
+        "search_latency": args.search_latency,
+        "real_models": args.real_models,
+        "warm_caches": args.warm_caches,
+        "fast_path": args.fast_path,
+    }
+
+    # Keep the search cache of benchmark runs away from the user's persistent one
+    worker_env = dict(os.environ, STUDYMATE_SEARCH_CACHE=os.path.join(args.pdf_dir, "search_cache.sqlite"))
+    if not args.fast_path:
+        # Scripted agent scenarios measure the full model round trips unless asked otherwise
+        worker_env.update(STUDYMATE_ROUTER="0", STUDYMATE_RETURN_DIRECT="")
+
+    results = []
+    for scenario in args.scenarios:
+        sizes = [min(args.sizes)] if scenario in SIZE_INDEPENDENT else args.sizes
+        for pages in sizes:
+            for backend in args.backends:
+                config = dict(base, scenario=scenario, pages=pages, pdf=pdfs[pages], backend=backend)
+                proc = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--worker", json.dumps(config)],
+                    cwd=ROOT, capture_output=True, text=True,
+                    env=dict(worker_env, STUDYMATE_INFERENCE_BACKEND=backend),
+                )
+                lines = [line[len(RESULT_MARKER):] for line in proc.stdout.splitlines() if line.startswith(RESULT_MARKER)]
+                if proc.returncode != 0 or not lines:
+                    error = (proc.stderr.strip().splitlines() or ["worker failed"])[-1]
+                    result = {"scenario": scenario, "pages": pages, "backend": backend, "error": error}
+                else:
+                    result = json.loads(lines[-1])
+                results.append(result)
+                print(json.dumps(result), file=sys.stderr)
+
+    report = {"config": base, "sizes": args.sizes, "results": results}
+    if len(args.backends) > 1:
+        report["comparison"] = _compare_backends(results, args.backends[0])
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Startup benchmark for the StudyMate CLI.
+
+Measures, each in a fresh interpreter:
+- wall time of `python main.py --help`
+- import time of the project modules and of the heavy third-party modules
+- time-to-first-prompt for `--mode prompt` (until the first Mistral call is issued)
+  and for the UI (until `demo.launch()` is reached)
+
+No network access is needed: the Mistral client and `demo.launch` are replaced inside the
+probe process. Results are printed (or written with --output) as JSON.
+
+    python benchmarks/startup.py --repeat 5 --output startup.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROJECT_MODULES = ["utils", "tools", "agent_loop", "run_prompt", "ui"]
+HEAVY_MODULES = ["torch", "transformers", "pymupdf", "gradio", "serpapi", "deep_translator", "mistralai"]
+
+PROBE = r'''
+import os, sys, time, json
+t0 = time.perf_counter()
+mode = sys.argv[1]
+sys.path.insert(0, os.path.abspath("studymate_agent"))
+
+def reached():
+    print("__STARTUP__" + json.dumps({"first_prompt_s": time.perf_counter() - t0}), flush=True)
+    os._exit(0)
+
+if mode == "prompt":
+    import mistralai
+
+    class _Chat:
+        def complete(self, **kwargs):
+            reached()
+
+        async def complete_async(self, **kwargs):
+            reached()
+
+    class _Mistral:
+        def __init__(self, *args, **kwargs):
+            self.chat = _Chat()
+
+    mistralai.Mistral = _Mistral
+    sys.argv = ["main.py", "--mode", "prompt", "--prompt", "Summarize the PDF pdfs/paper.pdf"]
+    import main
+    main.main()
+else:
+    import runpy
+    import gradio
+    gradio.Blocks.launch = lambda self, *args, **kwargs: reached()
+    runpy.run_path("studymate_agent/ui.py", run_name="__main__")
+'''
+
+
+def _run(cmd, env=None):
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True, env=env)
+    return time.perf_counter() - start, proc
+
+
+def _summary(samples):
+    if not samples:
+        return None
+    return {"median_s": round(statistics.median(samples), 4), "min_s": round(min(samples), 4), "runs": len(samples)}
+
+
+def bench_help(repeat):
+    return _summary([_run([sys.executable, "main.py", "--help"])[0] for _ in range(repeat)])
+
+
+def bench_import(module, repeat):
+    env = dict(os.environ, PYTHONPATH=os.path.join(ROOT, "studymate_agent"))
+    samples = []
+    for _ in range(repeat):
+        _, proc = _run([sys.executable, "-X", "importtime", "-c", f"import {module}"], env=env)
+        if proc.returncode != 0:
+            return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed"}
+        # Last matching line of -X importtime output: "import time: self | cumulative | module"
+        for line in reversed(proc.stderr.splitlines()):
+            match = re.match(r"import time:\s*\d+\s*\|\s*(\d+)\s*\|\s*(\S+)\s*$", line)
+            if match and match.group(2) == module:
+                samples.append(int(match.group(1)) / 1e6)
+                break
+    return _summary(samples)
+
+
+def bench_first_prompt(mode, repeat):
+    samples, process_samples = [], []
+    # The probe prompt is one the local router would answer without Mistral; time-to-first-prompt means the first model call
+    env = dict(os.environ, STUDYMATE_ROUTER="0")
+    for _ in range(repeat):
+        wall, proc = _run([sys.executable, "-c", PROBE, mode], env=env)
+        marker = [line for line in proc.stdout.splitlines() if line.startswith("__STARTUP__")]
+        if not marker:
+            return {"error": (proc.stderr.strip().splitlines() or ["probe did not reach the first prompt"])[-1]}
+        samples.append(json.loads(marker[0][len("__STARTUP__"):])["first_prompt_s"])
+        process_samples.append(wall)
+    return {"in_process": _summary(samples), "process_wall": _summary(process_samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="StudyMate startup benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=str, default=None, help="Write the JSON report to this file.")
+    args = parser.parse_args()
+
+    report = {
+        "python": sys.version.split()[0],
+        "cli_help": bench_help(args.repeat),
+        "imports": {module: bench_import(module, args.repeat) for module in PROJECT_MODULES + HEAVY_MODULES},
+        "time_to_first_prompt": {mode: bench_first_prompt(mode, args.repeat) for mode in ("prompt", "ui")},
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Synthetic academic-looking PDFs for benchmarks: a title page with an abstract and an
+introduction, numbered section headings in a larger font, and a references section.
+"""
+import os
+import random
+
+VOCABULARY = (
+    "model data training results method analysis network learning performance accuracy "
+    "baseline dataset experiment evaluation approach feature layer attention transformer "
+    "retrieval summary translation corpus language token sequence benchmark latency memory "
+    "robust efficient proposed significant improvement previous work related study section"
+).split()
+
+SECTION_TITLES = ["Introduction", "Related Work", "Method", "Experiments", "Results", "Discussion", "Conclusion"]
+
+PAGE_WORDS = 450
+BODY_SIZE = 9
+HEADING_SIZE = 13
+
+
+def _sentence(rng):
+    words = [rng.choice(VOCABULARY) for _ in range(rng.randint(8, 20))]
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraph(rng, words):
+    sentences, count = [], 0
+    while count < words:
+        sentence = _sentence(rng)
+        sentences.append(sentence)
+        count += len(sentence.split())
+    return " ".join(sentences)
+
+
+def build_pdf(path, pages, seed=0):
+    try:
+        import pymupdf as fitz
+    except ImportError:  # PyMuPDF < 1.24 only ships the fitz name
+        import fitz
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    # Spread the sections evenly over the document; the last pages hold the references
+    section_pages = {max(1, round(i * pages / len(SECTION_TITLES))): i for i in range(1, len(SECTION_TITLES))}
+    references_page = pages - 1 if pages > 2 else None
+
+    for number in range(pages):
+        page = doc.new_page()
+        y = 60
+        if number == 0:
+            page.insert_text((50, y), "A Synthetic Study of Efficient Document Understanding", fontsize=16)
+            y += 30
+            page.insert_text((50, y), "Abstract", fontsize=HEADING_SIZE)
+            y += 10
+            abstract = _paragraph(rng, 120)
+            page.insert_textbox(fitz.Rect(50, y, 545, y + 160), abstract, fontsize=BODY_SIZE)
+            y += 170
+            page.insert_text((50, y), "1. Introduction", fontsize=HEADING_SIZE)
+            y += 10
+            body_words = PAGE_WORDS // 2
+        elif number == references_page:
+            page.insert_text((50, y), "References", fontsize=HEADING_SIZE)
+            y += 10
+            references = "\n".join(
+                f"[{i + 1}] A. Author and B. Author. {_sentence(rng)} Journal of Examples, {2000 + i}."
+                for i in range(25)
+            )
+            page.insert_textbox(fitz.Rect(50, y, 545, 800), references, fontsize=BODY_SIZE)
+            continue
+        else:
+            if number in section_pages:
+                index = section_pages[number]
+                page.insert_text((50, y), f"{index + 1}. {SECTION_TITLES[index]}", fontsize=HEADING_SIZE)
+                y += 10
+            body_words = PAGE_WORDS
+
+        body = "\n\n".join(_paragraph(rng, body_words // 3) for _ in range(3))
+        page.insert_textbox(fitz.Rect(50, y, 545, 800), body, fontsize=BODY_SIZE)
+
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def ensure_pdfs(sizes, folder):
+    """Build (once) one synthetic PDF per page count and return {pages: path}."""
+    os.makedirs(folder, exist_ok=True)
+    paths = {}
+    for pages in sizes:
+        path = os.path.join(folder, f"synthetic_{pages}p.pdf")
+        if not os.path.exists(path):
+            build_pdf(path, pages, seed=pages)
+        paths[pages] = path
+    return paths
@@ -5,54 +5,18 @@ import os
 # sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 sys.path.insert(0, os.path.abspath("studymate_agent"))
 
-from run_prompt import run_prompt
-from utils import get_final_answer
-
-from mistralai import Mistral
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline, set_seed
-import torch
-from huggingface_hub import login
-import os
-from dotenv import load_dotenv
-import argparse
-
-def main():
-    load_dotenv(".env")
-    api_key = os.getenv("MISTRAL_API_KEY")
-    hf_token = os.getenv("HUGGINGFACE_TOKEN")
-    api_search_papers = os.getenv("GOOGLE_SCHOLAR_SEARCH")
-
-    login(token=hf_token)
-
-    model = "mistral-large-latest"
-    client = Mistral(api_key=api_key)
-
-    seed = 42
-    set_seed(seed)
-
-    model_name = "facebook/bart-large-cnn"
-    device = 0 if torch.cuda.is_available() else -1
-    tokenizer_bart = AutoTokenizer.from_pretrained(model_name)
-    model_bart = AutoModelForSeq2SeqLM.from_pretrained(model_name)
-
-    textgen = pipeline(
-        "text-generation",
-        model=model_bart,
-        tokenizer=tokenizer_bart,
-        device=device
-    )
-
-    def run_classic_prompt(prompt: str) -> str:
-        output = textgen(prompt, max_new_tokens=256, do_sample=False)
-        return output[0]["generated_text"].strip()
+# Heavy modules (torch, transformers, pymupdf, gradio, mistralai, ...) are imported inside the
+# code paths that need them, so `--help` and `--mode ui` start instantly.
 
 
+def build_parser():
     parser = argparse.ArgumentParser(description="StudyMate CLI")
     parser.add_argument(
         "--mode",
-        choices=["prompt", "ui"],
+        choices=["prompt", "ui", "batch", "serve-models"],
         required=True,
-        help="Mode to run: 'prompt' to run a single prompt, 'ui' to launch Gradio interface."
+        help="Mode to run: 'prompt' to run a single prompt, 'ui' to launch Gradio interface, 'batch' to process many prompts or PDFs, "
+             "'serve-models' to host the HF models for other StudyMate processes on this machine."
     )
     parser.add_argument(
         "--prompt",
@@ -60,26 +24,104 @@ def main():
         help="User prompt to pass to the agent if using --mode prompt.",
         required=False
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--input",
+        type=str,
+        help="Batch mode: a JSONL file of prompts/PDF jobs, or a folder of PDFs."
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="batch_results.jsonl",
+        help="Batch mode: JSONL file results are appended to; finished items are skipped on restart."
+    )
+    parser.add_argument(
+        "--operation",
+        choices=["summarize", "abstract", "translate"],
+        default="summarize",
+        help="Batch mode: operation applied to each PDF of an input folder."
+    )
+    parser.add_argument(
+        "--language",
+        type=str,
+        default="english",
+        help="Batch mode: target language for --operation translate."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Batch mode: worker processes (defaults to the number of cores)."
+    )
+    parser.add_argument(
+        "--socket",
+        type=str,
+        default=None,
+        help="serve-models mode: Unix socket to listen on (defaults to STUDYMATE_MODEL_SERVER, else models.sock in $XDG_RUNTIME_DIR/studymate)."
+    )
+    parser.add_argument(
+        "--warmup",
+        action="store_true",
+        help="Load every registered model at startup and report load time and memory per model."
+    )
+    return parser
 
-    if args.mode == "prompt":
-        system_message = {
-            "role": "system",
-            "content": "Only call functions using their defined parameters. For example, use `abstract`, not `query`, for search_similar."
-        }
 
+def main():
+    args = build_parser().parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv(".env")
+
+    if args.mode == "ui":
+        # ui.py runs in its own process and loads what it needs itself
+        env = dict(os.environ)
+        if args.warmup:
+            env["STUDYMATE_WARMUP"] = "all"
+        subprocess.run([sys.executable, "studymate_agent/ui.py"], env=env)
+        return
+
+    if args.mode == "serve-models":
+        # Point the UI / batch / prompt processes at it with STUDYMATE_MODEL_SERVER=<socket>
+        from model_server import serve
+        serve(args.socket)
+        return
+
+    if args.mode == "batch":
+        from batch import items_from_folder, items_from_jsonl, run_batch
+        if not args.input:
+            raise SystemExit("--input is required with --mode batch")
+        if os.path.isdir(args.input):
+            items = items_from_folder(args.input, args.operation, args.language)
+        else:
+            items = items_from_jsonl(args.input, args.operation, args.language)
+        print(run_batch(items, args.output, workers=args.workers))
+        return
+
+    from mistral_gateway import get_mistral_client
+    from run_prompt import SYSTEM_MESSAGE, run_prompt
+    from utils import get_final_answer
+    from artifacts import attach_artifacts
+    from model_registry import model_registry, run_classic_prompt
+
+    model = "mistral-large-latest"
+    client = get_mistral_client()
+
+    if args.warmup:
+        for name, info in model_registry.warmup().items():
+            print(f"🔥 {name}: {info}")
+
+    if args.mode == "prompt":
         user_prompt = args.prompt
-        conversation = [system_message, {"role": "user", "content": user_prompt}]
+        conversation = [SYSTEM_MESSAGE, {"role": "user", "content": user_prompt}]
 
+        # The classic-prompt model is loaded by the registry on the first answering_* call
         final_conversation = run_prompt(conversation, run_classic_prompt, client, model)
         print("\\n🧾 Final conversation:\\n")
         print(final_conversation)
         print("\\n🧾 Final Answer:\\n")
-        print(get_final_answer(final_conversation))
-
-    elif args.mode == "ui":
-        subprocess.run([sys.executable, "studymate_agent/ui.py"])
+        print(attach_artifacts(get_final_answer(final_conversation), final_conversation))
 
 if __name__ == "__main__":
-    
-    main()
\ No newline at end of file
+
+    main()
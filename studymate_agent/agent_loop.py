@@ -1,90 +1,339 @@
+import os
 import json
-from utils import safe_complete_call
-from mistralai import Mistral
+import queue
+import asyncio
+import threading
+import contextvars
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from mistralai.models import AssistantMessage, ToolCall, FunctionCall
+from utils import safe_complete_call_async, safe_stream_call_async, progress_sink, generate_tool_call_id, message_role, message_content
+from tracing import logger, span, record_usage
+from artifacts import compact_tool_result
+from router import ROUTER_ENABLED, RETURN_DIRECT_TOOLS, FromTool, route, direct_reply
 
-def agent_loop(conversation, tool_schemas, max_rounds=5, names_to_functions=None, client=None, model=None):
+# Tools that run HF models locally; everything else waits on the network (translator, SerpAPI)
+CPU_BOUND_TOOLS = {"summarize_text", "summarize_pdf", "answering_text", "answering_pdf"}
+
+IO_TOOL_WORKERS = int(os.getenv("STUDYMATE_IO_TOOL_WORKERS", "16"))
+CPU_TOOL_WORKERS = int(os.getenv("STUDYMATE_CPU_TOOL_WORKERS", "2"))
+# Model tool calls allowed to run or wait for the CPU pool at once; beyond that they are turned
+# away at once, so waiting summaries can never occupy every chat slot of the UI
+CPU_TOOL_QUEUE = int(os.getenv("STUDYMATE_CPU_TOOL_QUEUE", "8"))
+
+_io_executor = ThreadPoolExecutor(max_workers=IO_TOOL_WORKERS, thread_name_prefix="tool-io")
+# Model tools stay in-process (they share the loaded pipelines) but only a few may run at once
+_cpu_executor = ThreadPoolExecutor(max_workers=CPU_TOOL_WORKERS, thread_name_prefix="tool-cpu")
+
+
+_cpu_tool_slots = threading.BoundedSemaphore(CPU_TOOL_QUEUE)
+
+CPU_BUSY_MESSAGE = "⚠️ The summarization and question-answering models are busy with other requests. Please try again in a moment."
+
+
+def _executor_for(function_name):
+    return _cpu_executor if function_name in CPU_BOUND_TOOLS else _io_executor
+
+
+async def _run_tool(function, function_name, function_params, on_event=None):
+    if function_name not in CPU_BOUND_TOOLS:
+        return await _call_tool(function, function_name, function_params, on_event)
+    if not _cpu_tool_slots.acquire(blocking=False):
+        logger.warning(f"⚠️ {function_name} turned away: {CPU_TOOL_QUEUE} model tool calls already running or queued")
+        return CPU_BUSY_MESSAGE
+    try:
+        return await _call_tool(function, function_name, function_params, on_event)
+    finally:
+        _cpu_tool_slots.release()
+
+
+async def _call_tool(function, function_name, function_params, on_event=None):
+    def call():
+        with span("tool.call", tool=function_name) as tool_span:
+            if on_event is None:
+                result = function(**function_params)
+            else:
+                # Partial output the tool reports via emit_progress() becomes a tool_chunk event
+                with progress_sink(lambda text: on_event({"type": "tool_chunk", "name": function_name, "text": text})):
+                    result = function(**function_params)
+            tool_span.set(result_chars=len(result) if isinstance(result, str) else None)
+            return result
+
+    loop = asyncio.get_running_loop()
+    # Run inside a copy of the current context so the tool sees this call's progress sink
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor_for(function_name), context.run, call)
+
+
+def _delta_text(content):
+    if not content:
+        return ""
+    if isinstance(content, str):
+        return content
+    return "".join(getattr(part, "text", "") or "" for part in content)
+
+
+async def _stream_round(on_event, **kwargs):
+    """
+    Stream one model round, emitting content tokens as they arrive, and rebuild the complete
+    response so the loop can treat it exactly like a non-streamed one.
+    """
+    content = []
+    tool_calls = {}
+    finish_reason = None
+    usage = None
+    async for chunk in safe_stream_call_async(**kwargs):
+        # Mistral reports token usage on the last chunk of the stream
+        usage = getattr(chunk, "usage", None) or usage
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        text = _delta_text(choice.delta.content)
+        if text:
+            content.append(text)
+            on_event({"type": "token", "text": text})
+        for call in choice.delta.tool_calls or []:
+            index = call.index or 0
+            arguments = call.function.arguments
+            if index in tool_calls:
+                previous = tool_calls[index]
+                if isinstance(arguments, str) and isinstance(previous.function.arguments, str):
+                    previous.function.arguments += arguments
+            else:
+                tool_calls[index] = ToolCall(
+                    id=call.id,
+                    index=index,
+                    function=FunctionCall(name=call.function.name, arguments=arguments),
+                )
+        finish_reason = choice.finish_reason or finish_reason
+
+    message = AssistantMessage(
+        content="".join(content),
+        tool_calls=[tool_calls[i] for i in sorted(tool_calls)] or None,
+    )
+    return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason=finish_reason)], usage=usage)
+
+
+async def _routed_call(routed, names_to_functions, on_event):
+    """Resolve a Route's FromTool arguments; None if one of them produced no usable value."""
+    params = {}
+    for name, value in routed.params.items():
+        if isinstance(value, FromTool):
+            value = await _run_tool(names_to_functions[value.tool], value.tool, value.params, on_event)
+            if not isinstance(value, str) or value.startswith(("⚠️", "❌")):
+                return None
+        params[name] = value
+    tool_call = ToolCall(
+        id=generate_tool_call_id(),
+        function=FunctionCall(name=routed.tool, arguments=json.dumps(params)),
+    )
+    return AssistantMessage(content="", tool_calls=[tool_call])
+
+
+async def async_agent_loop(conversation, tool_schemas, max_rounds=5, names_to_functions=None, client=None, model=None, on_event=None, use_router=None):
     """
     tool_registry: dict[str, Callable] — mapping of tool name to function
     tool_schemas: list[dict] — list of Mistral tool definitions
     conversation: list[dict] — standard chat messages
+    on_event: optional callback; when given, model replies are streamed and progress is
+              reported as dict events (step, route, tool_start, tool_chunk, tool_end, token)
+    use_router: try the local intent router before the first model call (default: STUDYMATE_ROUTER)
+
+    The model may request several tools in one round; they run concurrently and their
+    results are appended in the order of the tool calls. For a routed request, or when every
+    tool of a round is in RETURN_DIRECT_TOOLS (opt-in), the tool output is the reply and no further
+    model round is made.
     """
-    result = None
     seen_calls = set()
     conversation = conversation.copy()
 
-    for step in range(max_rounds):
-        print(f"\n🧠 Step {step + 1} — calling model...\n")
-
-        if step > 0:
-            print(conversation)
-            response = safe_complete_call(
-                client=client,
-                model = model, 
-                messages = conversation,
-                tool_choice = "auto",
-                parallel_tool_calls = False,
-            )
-        else:
-            response = safe_complete_call(
-                client=client,
-                model = model,
-                messages = conversation,
-                tools = tool_schemas,
-                tool_choice = "any",
-                parallel_tool_calls = False,
-            )
-
-        # response = run_model(conversation, tool_registry)
-        conversation.append(response.choices[0].message)
-
-        print(100 * "▼")
-        print(f"Model response:\n{response}")
-        print(100 * "▲")
-
-        choice = response.choices[0]
-        msg = choice.message
-
-        if choice.finish_reason == "stop":
-            print("✅ Model signaled stop — final assistant reply.")
-            break
+    def emit(event):
+        if on_event is not None:
+            on_event(event)
+
+    # Unambiguous requests ("summarize this paper") skip the tool-choosing model call
+    routed_message = None
+    if (ROUTER_ENABLED if use_router is None else use_router) and conversation and message_role(conversation[-1]) == "user":
+        with span("router") as router_span:
+            routed = route(message_content(conversation[-1]), names_to_functions or {})
+            if routed is not None:
+                routed_message = await _routed_call(routed, names_to_functions, on_event)
+            router_span.set(tool=routed.tool if routed_message else None)
+        if routed_message is not None:
+            logger.info(f"🧭 Routed locally to {routed.tool} ({routed.rule})")
+            emit({"type": "route", "name": routed.tool})
 
-        tool_call = response.choices[0].message.tool_calls[0]
-        function_name = tool_call.function.name
-        function_params = json.loads(tool_call.function.arguments)
-        print("\nfunction_name: ", function_name, "\nfunction_params: ", function_params)
+    with span("agent.run", model=model, streaming=on_event is not None, routed=routed_message is not None) as run_span:
+        for step in range(max_rounds):
+            if step == 0 and routed_message is not None:
+                msg = routed_message
+                conversation.append(msg)
+            else:
+                logger.info(f"🧠 Step {step + 1} — calling model...")
+                emit({"type": "step", "step": step + 1})
+                run_span.add(model_calls=1)
 
+                if step > 0:
+                    logger.debug("Conversation:\n%s", conversation)
+                    request = dict(tool_choice = "auto")
+                else:
+                    request = dict(tools = tool_schemas, tool_choice = "any")
 
-    
-        for tool_call in msg.tool_calls:
-            function_name = tool_call.function.name
-            function_params = json.loads(tool_call.function.arguments)
-            
-            # Fix incorrect arguments from model
-            if function_name == "search_similar":
-                if "query" in function_params:
-                    function_params["abstract"] = function_params.pop("query")
+                with span("model.call", model=model, step=step + 1, tool_choice=request["tool_choice"]) as call_span:
+                    if on_event is not None:
+                        response = await _stream_round(
+                            on_event,
+                            client=client,
+                            model = model,
+                            messages = conversation,
+                            parallel_tool_calls = True,
+                            **request,
+                        )
+                    else:
+                        response = await safe_complete_call_async(
+                            client=client,
+                            model = model,
+                            messages = conversation,
+                            parallel_tool_calls = True,
+                            **request,
+                        )
+                    record_usage(call_span, getattr(response, "usage", None))
 
-            call_signature = (function_name, tuple(sorted(function_params.items())))
+                conversation.append(response.choices[0].message)
+                logger.debug("Model response:\n%s", response)
 
-            if call_signature in seen_calls:
-                print(f"🛑 Repeated call to {function_name} with same arguments. Stopping to avoid infinite loop.")
-                return conversation
-            seen_calls.add(call_signature)
+                choice = response.choices[0]
+                msg = choice.message
 
-            function_result = names_to_functions[function_name](**function_params)
+                if choice.finish_reason == "stop" or not msg.tool_calls:
+                    logger.info("✅ Model signaled stop — final assistant reply.")
+                    break
 
-            print(100 * "▼")
-            print(f"Tool Call: {function_name}({function_params})")
-            print(f"Function result:\n{function_result}")
-            print(100 * "▲")
+            calls = []
+            for tool_call in msg.tool_calls:
+                function_name = tool_call.function.name
+                function_params = tool_call.function.arguments
+                if isinstance(function_params, str):
+                    function_params = json.loads(function_params)
 
+                # Fix incorrect arguments from model
+                if function_name == "search_similar":
+                    if "query" in function_params:
+                        function_params["abstract"] = function_params.pop("query")
 
-            conversation.append({
-                "role":"tool", 
-                "name":function_name, 
-                "content":function_result, 
-                "tool_call_id":tool_call.id
-            })
+                call_signature = (function_name, tuple(sorted(function_params.items())))
+
+                if call_signature in seen_calls:
+                    logger.warning(f"🛑 Repeated call to {function_name} with same arguments. Stopping to avoid infinite loop.")
+                    return conversation
+                seen_calls.add(call_signature)
+
+                logger.info(f"🔧 {function_name}({', '.join(function_params)})")
+                logger.debug("function_params: %s", function_params)
+                calls.append((tool_call, function_name, function_params))
+
+            async def run_and_report(function_name, function_params):
+                emit({"type": "tool_start", "name": function_name, "params": function_params})
+                result = await _run_tool(names_to_functions[function_name], function_name, function_params, on_event)
+                emit({"type": "tool_end", "name": function_name})
+                return result
+
+            results = await asyncio.gather(*[
+                run_and_report(function_name, function_params)
+                for _, function_name, function_params in calls
+            ])
+
+            for (tool_call, function_name, function_params), function_result in zip(calls, results):
+                logger.debug("Tool Call: %s(%s)\nFunction result:\n%s", function_name, function_params, function_result)
+
+                # Large results (e.g. a translated paper) go to the artifact store instead of the context
+                conversation.append({
+                    "role":"tool",
+                    "name":function_name,
+                    "content":compact_tool_result(function_name, function_result),
+                    "tool_call_id":tool_call.id
+                })
+
+            routed_round = step == 0 and routed_message is not None
+            if routed_round or all(function_name in RETURN_DIRECT_TOOLS for _, function_name, _ in calls):
+                logger.info("✅ Returning tool output directly.")
+                conversation.append({
+                    "role": "assistant",
+                    "content": direct_reply([(function_name, result) for (_, function_name, _), result in zip(calls, results)]),
+                })
+                break
+
+    return conversation
+
+
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+
+def _shared_loop():
+    """
+    One event loop per process, on its own thread, for every agent run. The Mistral SDK's async
+    HTTP client keeps connections bound to the loop that opened them, so the process-wide client
+    only works if all runs share a loop that never closes.
+    """
+    global _loop, _loop_pid
+    with _loop_lock:
+        # A forked batch worker inherits the variable but not the thread running the loop
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name="agent-loop", daemon=True).start()
+        return _loop
+
+
+def run_sync(coro):
+    """Run a coroutine on the shared agent event loop and wait for its result from sync code."""
+    loop = _shared_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        raise RuntimeError("run_sync() called from the agent event loop itself; await the coroutine instead")
+    # The task is created with a copy of the caller's context, so spans and progress sinks carry over
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def agent_loop(conversation, tool_schemas, max_rounds=5, names_to_functions=None, client=None, model=None):
+    """Synchronous entry point used by run_prompt and the Gradio UI."""
+    return run_sync(async_agent_loop(
+        conversation, tool_schemas, max_rounds, names_to_functions, client=client, model=model
+    ))
+
+
+def stream_agent_loop(conversation, tool_schemas, max_rounds=5, names_to_functions=None, client=None, model=None):
+    """
+    Generator version of agent_loop for incremental UIs. Yields the progress events of
+    async_agent_loop as they happen and finally {"type": "final", "conversation": [...]}.
+    """
+    events = queue.Queue()
+    done = object()
+    outcome = {}
+
+    def worker():
+        try:
+            outcome["conversation"] = run_sync(async_agent_loop(
+                conversation, tool_schemas, max_rounds, names_to_functions,
+                client=client, model=model, on_event=events.put,
+            ))
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            events.put(done)
+
+    threading.Thread(target=worker, name="agent-stream", daemon=True).start()
+    while True:
+        event = events.get()
+        if event is done:
+            break
+        yield event
 
-            
-    return conversation
\ No newline at end of file
+    if "error" in outcome:
+        raise outcome["error"]
+    yield {"type": "final", "conversation": outcome["conversation"]}
@@ -0,0 +1,108 @@
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from utils import message_role, message_content
+
+# Tool results longer than this are stored as artifacts; the model only sees a handle and a preview
+ARTIFACT_THRESHOLD_CHARS = int(os.getenv("STUDYMATE_ARTIFACT_THRESHOLD", "4000"))
+PREVIEW_CHARS = 600
+
+HANDLE_PATTERN = re.compile(r"\[artifact (art_[0-9a-f]{16})\]")
+
+
+class ArtifactStore:
+    """
+    Full tool outputs (translated documents, long summaries) keyed by a content-derived handle.
+
+    Artifacts live in an in-memory LRU (max_artifacts entries). With cache_dir set they are also
+    written there as <handle>.txt, so handles stay valid after the LRU evicts them.
+    """
+
+    def __init__(self, max_artifacts=64, cache_dir=None):
+        self.max_artifacts = max_artifacts
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._artifacts = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def handle_for(text):
+        return "art_" + hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+    def put(self, text):
+        handle = self.handle_for(text)
+        with self._lock:
+            self._artifacts[handle] = text
+            self._artifacts.move_to_end(handle)
+            while len(self._artifacts) > self.max_artifacts:
+                self._artifacts.popitem(last=False)
+        if self.cache_dir:
+            path = self.cache_dir / f"{handle}.txt"
+            if not path.exists():
+                tmp_path = self.cache_dir / f"{handle}.{threading.get_ident()}.tmp"
+                tmp_path.write_text(text, encoding="utf-8")
+                os.replace(tmp_path, path)
+        return handle
+
+    def get(self, handle):
+        """Return the full text for handle, or None if it is unknown (or was evicted without a disk copy)."""
+        with self._lock:
+            text = self._artifacts.get(handle)
+            if text is not None:
+                self._artifacts.move_to_end(handle)
+                return text
+        if self.cache_dir:
+            path = self.cache_dir / f"{handle}.txt"
+            if path.exists():
+                return path.read_text(encoding="utf-8")
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"artifacts": len(self._artifacts), "chars": sum(len(t) for t in self._artifacts.values())}
+
+
+artifact_store = ArtifactStore(cache_dir=os.getenv("STUDYMATE_ARTIFACT_DIR") or None)
+
+
+def compact_tool_result(function_name, result):
+    """
+    What the model gets to see of a tool result: small results as they are, large ones as a
+    handle plus a preview. The full text is shown to the user, not sent back to Mistral.
+    """
+    if not isinstance(result, str) or len(result) <= ARTIFACT_THRESHOLD_CHARS:
+        return result
+    handle = artifact_store.put(result)
+    preview = result[:PREVIEW_CHARS].rsplit(" ", 1)[0]
+    return (
+        f"[artifact {handle}] Output of {function_name}: {len(result)} characters, shown to the user in full.\n"
+        f"Preview:\n{preview} …\n"
+        "Do not repeat the full text; tell the user it is attached below your reply."
+    )
+
+
+def artifact_handles(messages):
+    """Handles referenced by the tool messages in messages, in order and without duplicates."""
+    handles = []
+    for message in messages:
+        content = message_content(message)
+        if message_role(message) == "tool" and isinstance(content, str):
+            for handle in HANDLE_PATTERN.findall(content):
+                if handle not in handles:
+                    handles.append(handle)
+    return handles
+
+
+def attach_artifacts(reply, conversation):
+    """Append the full text of every artifact produced since the last user message to the final reply."""
+    last_user = max((i for i, m in enumerate(conversation) if message_role(m) == "user"), default=-1)
+    parts = [reply or ""]
+    for handle in artifact_handles(conversation[last_user + 1:]):
+        text = artifact_store.get(handle)
+        if text is not None:
+            parts.append(f"📎 {handle}\n\n{text}")
+    return "\n\n---\n\n".join(p for p in parts if p)
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+OPERATIONS = ("prompt", "summarize", "abstract", "translate")
+
+# Models worth loading when a worker starts, per operation; everything else loads on first use
+WARM_MODELS = {"summarize": ["summarizer"]}
+
+
+# === Collecting work items ===
+def items_from_jsonl(path, default_operation="prompt", language=None):
+    """
+    One item per line. A line is either a prompt ({"id", "prompt"} — "request_id" and "body"
+    are accepted as aliases) or a PDF job ({"id", "pdf", "operation", "language"}).
+    """
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            operation = record.get("operation") or ("prompt" if "pdf" not in record else default_operation)
+            item = {
+                "id": str(record.get("id") or record.get("request_id") or f"line-{line_number}"),
+                "operation": operation,
+                "language": record.get("language") or language,
+            }
+            if operation == "prompt":
+                item["prompt"] = record.get("prompt") or record.get("body") or ""
+            else:
+                item["pdf"] = record["pdf"]
+            items.append(item)
+    return items
+
+
+def items_from_folder(folder, operation, language=None):
+    items = []
+    for pdf in sorted(Path(folder).rglob("*.pdf")):
+        item_id = f"{pdf.relative_to(folder)}:{operation}"
+        if operation == "translate":
+            item_id += f":{language}"
+        items.append({"id": item_id, "operation": operation, "pdf": str(pdf), "language": language})
+    return items
+
+
+def completed_ids(output_path):
+    """IDs already written with status "ok", so a restarted run can skip them."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by a crash
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+# === Worker process ===
+def _init_worker(threads_per_worker, warm_models):
+    # Must happen before torch is imported so intra-op threads don't oversubscribe the cores
+    os.environ["OMP_NUM_THREADS"] = str(threads_per_worker)
+    os.environ["MKL_NUM_THREADS"] = str(threads_per_worker)
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    if warm_models:
+        from model_registry import model_registry
+        model_registry.warmup(warm_models)
+
+
+def _run_item(item):
+    start = time.perf_counter()
+    record = {"id": item["id"], "operation": item["operation"]}
+    try:
+        operation = item["operation"]
+        if operation == "prompt":
+            from run_prompt import SYSTEM_MESSAGE, run_prompt
+            from utils import get_final_answer
+            from artifacts import attach_artifacts
+            from model_registry import run_classic_prompt
+            from mistral_gateway import get_mistral_client
+
+            conversation = [SYSTEM_MESSAGE, {"role": "user", "content": item["prompt"]}]
+            final_conversation = run_prompt(conversation, run_classic_prompt, get_mistral_client(), "mistral-large-latest")
+            output = attach_artifacts(get_final_answer(final_conversation), final_conversation)
+        elif operation == "summarize":
+            from tools import summarize_pdf
+            output = summarize_pdf(item["pdf"])
+        elif operation == "abstract":
+            from tools import abstract_from_pdf
+            output = abstract_from_pdf(item["pdf"])
+        elif operation == "translate":
+            from tools import translate_pdf
+            output = translate_pdf(item["pdf"], item.get("language") or "english")
+        else:
+            raise ValueError(f"Unknown operation '{operation}'. Expected one of {OPERATIONS}.")
+        record.update(status="ok", output=output)
+    except Exception as e:
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+# === Driver ===
+def run_batch(items, output_path, workers=None):
+    """
+    Run items on a process pool and append one JSON line per finished item to output_path.
+    Items already recorded as "ok" in output_path are skipped, so an interrupted run can
+    simply be started again.
+    """
+    done = completed_ids(output_path)
+    pending = [item for item in items if item["id"] not in done]
+    print(f"📦 {len(items)} items, {len(items) - len(pending)} already done, {len(pending)} to run.")
+    if not pending:
+        return {"total": len(items), "skipped": len(items), "ok": 0, "error": 0}
+
+    cores = os.cpu_count() or 1
+    workers = max(1, min(workers or cores, len(pending)))
+    threads_per_worker = max(1, cores // workers)
+    warm_models = sorted({name for item in pending for name in WARM_MODELS.get(item["operation"], [])})
+
+    counts = {"ok": 0, "error": 0}
+    # spawn: workers must not inherit torch/tokenizer thread state from the parent
+    context = multiprocessing.get_context("spawn")
+    with open(output_path, "a", encoding="utf-8") as out, ProcessPoolExecutor(
+        max_workers=workers, mp_context=context,
+        initializer=_init_worker, initargs=(threads_per_worker, warm_models),
+    ) as pool:
+        futures = [pool.submit(_run_item, item) for item in pending]
+        for number, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            counts[record["status"]] += 1
+            print(f"{'✅' if record['status'] == 'ok' else '❌'} [{number}/{len(pending)}] {record['id']} ({record['seconds']}s)")
+
+    return {"total": len(items), "skipped": len(items) - len(pending), **counts}
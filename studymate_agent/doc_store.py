@@ -0,0 +1,241 @@
+import os
+import json
+import hashlib
+import itertools
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from concurrent.futures import Future
+from tracing import span
+
+
+def _open_pdf(file_path):
+    try:
+        import pymupdf
+    except ImportError:  # PyMuPDF < 1.24 only ships the fitz name
+        import fitz as pymupdf
+    return pymupdf.open(file_path)
+
+
+def _parse_pages(file_path, start=0, stop=None):
+    """Page texts straight from PyMuPDF; the document is closed as soon as the consumer stops."""
+    with _open_pdf(file_path) as doc:
+        stop = doc.page_count if stop is None else min(stop, doc.page_count)
+        for number in range(start, stop):
+            yield doc.load_page(number).get_text()
+
+
+class DocumentStore:
+    """
+    Parses each PDF once and keeps its per-page text, keyed by the SHA-256 of the file content.
+
+    Parsed documents live in an in-memory LRU (max_documents entries). When cache_dir is set,
+    pages are also written there as <hash>.jsonl (one JSON string per page) so they survive restarts.
+    iter_pages() streams pages (or a page range) instead for documents of more than stream_pages
+    pages, which are too large to hold whole; smaller ones are parsed once and kept like get_pages().
+    """
+
+    def __init__(self, max_documents=16, cache_dir=None, stream_pages=200):
+        self.max_documents = max_documents
+        self.stream_pages = stream_pages
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._docs = OrderedDict()
+        self._hashes = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._parsing = {}
+
+    def content_hash(self, file_path: str) -> str:
+        # Re-hashing a large PDF on every turn is wasteful, so remember the hash per (path, size, mtime)
+        stat = os.stat(file_path)
+        stamp = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._hashes.get(stamp)
+        if digest:
+            return digest
+
+        sha = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        digest = sha.hexdigest()
+        with self._lock:
+            self._hashes[stamp] = digest
+        return digest
+
+    def get_pages(self, file_path: str):
+        """Return the list of page texts for file_path, or None if the file does not exist."""
+        if not Path(file_path).exists():
+            return None
+        key = self.content_hash(file_path)
+
+        with self._lock:
+            pages = self._docs.get(key)
+            if pages is not None:
+                self._docs.move_to_end(key)
+                self.hits += 1
+                return pages
+            # Concurrent requests for the same document wait for the one parse already running
+            future = self._parsing.get(key)
+            owner = future is None
+            if owner:
+                future = self._parsing[key] = Future()
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            pages = self._load(file_path, key)
+            future.set_result(pages)
+            return pages
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._parsing.pop(key, None)
+
+    def _load(self, file_path, key):
+        with span("pdf.parse", file=os.path.basename(file_path)) as parse_span:
+            pages = self._read_disk(key)
+            if pages is not None:
+                parse_span.set(source="disk")
+                with self._lock:
+                    self.disk_hits += 1
+            else:
+                pages = list(_parse_pages(file_path))
+                parse_span.set(source="pymupdf")
+                with self._lock:
+                    self.misses += 1
+                self._write_disk(key, pages)
+            parse_span.set(pages=len(pages))
+
+        self._remember(key, pages)
+        return pages
+
+    def iter_pages(self, file_path: str, start: int = 0, stop=None):
+        """
+        Yield the text of pages start..stop-1 one at a time, without holding the document in memory.
+
+        Pages come from the in-memory LRU or the disk cache when the document is there. Otherwise
+        documents of up to stream_pages pages are parsed whole through get_pages(), so the next
+        call is a hit, and larger ones stream straight from PyMuPDF: stopping early (break, or a
+        small stop) leaves the rest unread, and a full streamed read fills the disk cache.
+        Yields nothing if the file does not exist.
+        """
+        if not Path(file_path).exists():
+            return
+        key = self.content_hash(file_path)
+
+        with self._lock:
+            pages = self._docs.get(key)
+            if pages is not None:
+                self._docs.move_to_end(key)
+                self.hits += 1
+        if pages is not None:
+            yield from pages[start:stop]
+            return
+
+        if self.cache_dir and self._disk_path(key).exists():
+            with self._lock:
+                self.disk_hits += 1
+            with open(self._disk_path(key), "r", encoding="utf-8") as f:
+                for line in itertools.islice(f, start, stop):
+                    yield json.loads(line)
+            return
+
+        with _open_pdf(file_path) as doc:
+            small = doc.page_count <= self.stream_pages
+        if small:
+            yield from self.get_pages(file_path)[start:stop]
+            return
+
+        with self._lock:
+            self.misses += 1
+        if not (self.cache_dir and start == 0 and stop is None):
+            yield from _parse_pages(file_path, start, stop)
+            return
+
+        # Write the cache entry as pages stream by; it only becomes visible if the read completes
+        path = self._disk_path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        completed = False
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for page in _parse_pages(file_path):
+                    f.write(json.dumps(page) + "\n")
+                    yield page
+            completed = True
+            os.replace(tmp_path, path)
+        finally:
+            if not completed:
+                tmp_path.unlink(missing_ok=True)
+
+    def _remember(self, key, pages):
+        with self._lock:
+            self._docs[key] = pages
+            self._docs.move_to_end(key)
+            while len(self._docs) > self.max_documents:
+                self._docs.popitem(last=False)
+
+    def _disk_path(self, key):
+        return self.cache_dir / f"{key}.jsonl"
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        if not path.exists():
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def _write_disk(self, key, pages):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for page in pages:
+                f.write(json.dumps(page) + "\n")
+        os.replace(tmp_path, path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "documents_in_memory": len(self._docs),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._docs.clear()
+            self._hashes.clear()
+            self.hits = self.disk_hits = self.misses = self.coalesced = 0
+
+
+# === Shared store used by every PDF tool ===
+doc_store = DocumentStore(
+    max_documents=int(os.getenv("STUDYMATE_DOC_CACHE_SIZE", "16")),
+    cache_dir=os.getenv("STUDYMATE_DOC_CACHE_DIR") or None,
+    stream_pages=int(os.getenv("STUDYMATE_STREAM_PAGES", "200")),
+)
+
+
+def get_pdf_pages(file_path: str):
+    return doc_store.get_pages(file_path)
+
+
+def iter_pdf_pages(file_path: str, start: int = 0, stop=None):
+    return doc_store.iter_pages(file_path, start, stop)
@@ -0,0 +1,326 @@
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from mistralai.models import SDKError
+from tracing import logger, tracer
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. reserve() takes the tokens immediately (the balance may go
+    negative) and returns how long the caller must wait before using them, so the same
+    bucket serves sync and async callers in arrival order.
+    """
+
+    def __init__(self, rate_per_second, capacity):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1.0) -> float:
+        if self.rate <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+
+def _jsonable(value):
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    return str(value)
+
+
+def request_key(model, messages, tools=None, tool_choice=None) -> str:
+    """Stable hash of the parts of a request that determine a deterministic response."""
+    payload = {"model": model, "messages": messages, "tools": tools, "tool_choice": tool_choice}
+    encoded = json.dumps(payload, sort_keys=True, default=_jsonable, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def estimate_tokens(kwargs) -> int:
+    # ~4 characters per token for the prompt, plus the completion budget
+    prompt_chars = len(json.dumps(kwargs.get("messages", []), default=_jsonable))
+    prompt_chars += len(json.dumps(kwargs.get("tools") or [], default=_jsonable))
+    return prompt_chars // 4 + (kwargs.get("max_tokens") or 512)
+
+
+def _retry_after_seconds(error):
+    headers = getattr(error, "headers", None)
+    value = headers.get("retry-after") if headers else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class MistralGateway:
+    """
+    Shared layer for every Mistral chat call in the process:
+    - token-bucket rate limiting on requests per second and tokens per minute, plus a cap on in-flight calls
+    - exponential backoff with full jitter on 429/5xx, honoring Retry-After
+    - optional LRU response cache keyed by request_key(), for calls that explicitly ask for temperature 0
+    """
+
+    def __init__(self, requests_per_second=5.0, tokens_per_minute=500_000, max_in_flight=8,
+                 max_retries=5, backoff_base=1.0, backoff_max=30.0, cache_size=0):
+        self.request_bucket = TokenBucket(requests_per_second, max(1.0, requests_per_second))
+        self.token_bucket = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute)
+        self.in_flight = threading.BoundedSemaphore(max_in_flight)
+        # Async callers block for a slot here, off the event loop and out of its default executor
+        self._slot_waiter = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mistral-slot")
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {
+            "calls": 0,
+            "cache_hits": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "failures": 0,
+            "queue_wait_seconds": 0.0,
+            "max_queue_wait_seconds": 0.0,
+        }
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            requests_per_second=float(os.getenv("STUDYMATE_MISTRAL_RPS", "5")),
+            tokens_per_minute=float(os.getenv("STUDYMATE_MISTRAL_TPM", "500000")),
+            max_in_flight=int(os.getenv("STUDYMATE_MISTRAL_MAX_IN_FLIGHT", "8")),
+            max_retries=int(os.getenv("STUDYMATE_MISTRAL_MAX_RETRIES", "5")),
+            cache_size=int(os.getenv("STUDYMATE_LLM_CACHE_SIZE", "0")),
+        )
+
+    # === Metrics ===
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._metrics[name] += amount
+
+    def _record_wait(self, seconds):
+        with self._lock:
+            self._metrics["queue_wait_seconds"] += seconds
+            self._metrics["max_queue_wait_seconds"] = max(self._metrics["max_queue_wait_seconds"], seconds)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            metrics = dict(self._metrics)
+        calls = metrics["calls"]
+        metrics["avg_queue_wait_seconds"] = metrics["queue_wait_seconds"] / calls if calls else 0.0
+        metrics["cache_entries"] = len(self._cache)
+        return metrics
+
+    # === Cache ===
+    def _cache_key(self, kwargs):
+        if not self.cache_size or kwargs.get("stream"):
+            return None
+        # Only calls that explicitly ask for deterministic decoding are cacheable
+        if kwargs.get("temperature", None) != 0:
+            return None
+        return request_key(kwargs.get("model"), kwargs.get("messages"), kwargs.get("tools"), kwargs.get("tool_choice"))
+
+    def _cache_get(self, key):
+        if key is None:
+            return None
+        with self._lock:
+            response = self._cache.get(key)
+            if response is not None:
+                self._cache.move_to_end(key)
+                self._metrics["cache_hits"] += 1
+            return response
+
+    def _cache_put(self, key, response):
+        if key is None:
+            return
+        with self._lock:
+            self._cache[key] = response
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # === Concurrency ===
+    async def _acquire_slot(self):
+        if self.in_flight.acquire(blocking=False):
+            return
+        waiting = asyncio.get_running_loop().run_in_executor(self._slot_waiter, self.in_flight.acquire)
+        try:
+            await asyncio.shield(waiting)
+        except asyncio.CancelledError:
+            # The waiter thread still takes the slot; hand it back once it does
+            waiting.add_done_callback(lambda _: self.in_flight.release())
+            raise
+
+    # === Retry policy ===
+    def _backoff(self, attempt, error):
+        retry_after = _retry_after_seconds(error)
+        jittered = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            return retry_after + jittered * 0.1
+        return jittered
+
+    def _is_retryable(self, error):
+        if error.status_code == 429:
+            self._count("rate_limited")
+        return error.status_code in RETRY_STATUS_CODES
+
+    def _mark_span(self, **attributes):
+        current = tracer.current_span()
+        if current is not None:
+            current.set(**attributes)
+
+    # === Calls ===
+    def complete(self, client, **kwargs):
+        key = self._cache_key(kwargs)
+        cached = self._cache_get(key)
+        if cached is not None:
+            self._mark_span(cache_hit=True)
+            return cached
+
+        for attempt in range(self.max_retries + 1):
+            start = time.monotonic()
+            self.in_flight.acquire()
+            try:
+                time.sleep(max(self.request_bucket.reserve(), self.token_bucket.reserve(estimate_tokens(kwargs))))
+                self._record_wait(time.monotonic() - start)
+                self._mark_span(queue_wait_ms=round((time.monotonic() - start) * 1000, 3), attempts=attempt + 1)
+                self._count("calls")
+                response = client.chat.complete(**kwargs)
+            except SDKError as e:
+                if not self._is_retryable(e):
+                    self._count("failures")
+                    raise
+                if attempt == self.max_retries:
+                    break
+                delay = self._backoff(attempt, e)
+                logger.warning(f"⚠️ Mistral error ({e.status_code}). Retry {attempt + 1}/{self.max_retries} in {delay:.1f}s...")
+                self._count("retries")
+            else:
+                self._cache_put(key, response)
+                return response
+            finally:
+                self.in_flight.release()
+            time.sleep(delay)
+        self._count("failures")
+        raise RuntimeError(f"❌ Failed after {self.max_retries} retries due to service capacity limits.")
+
+    async def complete_async(self, client, **kwargs):
+        key = self._cache_key(kwargs)
+        cached = self._cache_get(key)
+        if cached is not None:
+            self._mark_span(cache_hit=True)
+            return cached
+
+        for attempt in range(self.max_retries + 1):
+            start = time.monotonic()
+            await self._acquire_slot()
+            try:
+                await asyncio.sleep(max(self.request_bucket.reserve(), self.token_bucket.reserve(estimate_tokens(kwargs))))
+                self._record_wait(time.monotonic() - start)
+                self._mark_span(queue_wait_ms=round((time.monotonic() - start) * 1000, 3), attempts=attempt + 1)
+                self._count("calls")
+                response = await client.chat.complete_async(**kwargs)
+            except SDKError as e:
+                if not self._is_retryable(e):
+                    self._count("failures")
+                    raise
+                if attempt == self.max_retries:
+                    break
+                delay = self._backoff(attempt, e)
+                logger.warning(f"⚠️ Mistral error ({e.status_code}). Retry {attempt + 1}/{self.max_retries} in {delay:.1f}s...")
+                self._count("retries")
+            else:
+                self._cache_put(key, response)
+                return response
+            finally:
+                self.in_flight.release()
+            await asyncio.sleep(delay)
+        self._count("failures")
+        raise RuntimeError(f"❌ Failed after {self.max_retries} retries due to service capacity limits.")
+
+    async def stream_async(self, client, **kwargs):
+        """
+        Yield completion chunks as they arrive. Rate limiting and retries apply to opening the
+        stream; the in-flight slot is held until the stream is fully consumed.
+        """
+        for attempt in range(self.max_retries + 1):
+            start = time.monotonic()
+            await self._acquire_slot()
+            stream = None
+            try:
+                await asyncio.sleep(max(self.request_bucket.reserve(), self.token_bucket.reserve(estimate_tokens(kwargs))))
+                self._record_wait(time.monotonic() - start)
+                self._mark_span(queue_wait_ms=round((time.monotonic() - start) * 1000, 3), attempts=attempt + 1)
+                self._count("calls")
+                stream = await client.chat.stream_async(**kwargs)
+            except SDKError as e:
+                if not self._is_retryable(e):
+                    self._count("failures")
+                    raise
+                if attempt == self.max_retries:
+                    break
+                delay = self._backoff(attempt, e)
+                logger.warning(f"⚠️ Mistral error ({e.status_code}). Retry {attempt + 1}/{self.max_retries} in {delay:.1f}s...")
+                self._count("retries")
+            finally:
+                # Whatever stopped the stream from opening (HTTP error, timeout, cancellation), give the slot back
+                if stream is None:
+                    self.in_flight.release()
+            if stream is None:
+                await asyncio.sleep(delay)
+                continue
+            try:
+                async for event in stream:
+                    yield event.data
+            finally:
+                self.in_flight.release()
+            return
+        self._count("failures")
+        raise RuntimeError(f"❌ Failed after {self.max_retries} retries due to service capacity limits.")
+
+
+# === Shared gateway for the whole process ===
+gateway = MistralGateway.from_env()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_mistral_client():
+    """
+    One Mistral client, and so one HTTP connection pool, shared by every session in the process.
+    Its async pool is bound to the event loop it first runs on, which is why agent runs all go
+    through agent_loop's shared loop.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            from mistralai import Mistral
+            _client = Mistral(api_key=os.getenv("MISTRAL_API_KEY"))
+        return _client
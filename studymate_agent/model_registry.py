@@ -0,0 +1,274 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from tracing import logger, span
+
+
+def _rss_bytes() -> int:
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def _parameter_bytes(model) -> int:
+    inner = getattr(model, "model", model)
+    try:
+        return sum(p.numel() * p.element_size() for p in inner.parameters())
+    except (AttributeError, TypeError):
+        return 0
+
+
+class ModelRegistry:
+    """
+    Process-wide home for the HF pipelines. Each model is loaded once on first use (or at warmup)
+    and kept for the lifetime of the process.
+
+    get(name) returns the shared pipeline; use(name) additionally holds the model's inference lock,
+    so callers from different threads never run the same pipeline at the same time. Models
+    registered with exclusive=False (served by another process) are used without the lock.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._stats = {}
+        self._load_locks = {}
+        self._call_locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, exclusive=True):
+        with self._lock:
+            self._loaders[name] = loader
+            self._load_locks.setdefault(name, threading.Lock())
+            if exclusive:
+                self._call_locks.setdefault(name, threading.Lock())
+            else:
+                self._call_locks[name] = None
+
+    def is_loaded(self, name) -> bool:
+        return name in self._models
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            if name not in self._loaders:
+                raise KeyError(f"Unknown model '{name}'. Registered: {sorted(self._loaders)}")
+            load_lock = self._load_locks[name]
+            loader = self._loaders[name]
+
+        with load_lock:
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            logger.info(f"⏳ Loading model '{name}'...")
+            rss_before = _rss_bytes()
+            start = time.perf_counter()
+            with span("model.load", model=name):
+                model = loader()
+            load_seconds = time.perf_counter() - start
+            rss_after = _rss_bytes()
+
+            self._stats[name] = {
+                "load_seconds": round(load_seconds, 3),
+                "rss_delta_mb": round((rss_after - rss_before) / 2**20, 1),
+                "parameter_mb": round(_parameter_bytes(model) / 2**20, 1),
+            }
+            self._models[name] = model
+            logger.info(f"✅ Model '{name}' loaded in {load_seconds:.1f}s")
+            return model
+
+    @contextmanager
+    def use(self, name):
+        model = self.get(name)
+        call_lock = self._call_locks[name]
+        if call_lock is None:
+            yield model
+            return
+        with call_lock:
+            yield model
+
+    def warmup(self, names=None):
+        for name in names or list(self._loaders):
+            self.get(name)
+        return self.stats()
+
+    def stats(self) -> dict:
+        return {
+            name: dict(self._stats.get(name, {}), loaded=self.is_loaded(name))
+            for name in self._loaders
+        }
+
+
+SUMMARIZER_MODEL = "sshleifer/distilbart-cnn-12-6"
+TEXTGEN_MODEL = "facebook/bart-large-cnn"
+SEED = 42
+
+# torch: fp32 PyTorch (GPU for textgen when available); int8: PyTorch with dynamically quantized
+# Linear layers, CPU only; onnx: ONNX Runtime export (needs `optimum[onnxruntime]`), CPU only
+INFERENCE_BACKENDS = ("torch", "int8", "onnx")
+INFERENCE_BACKEND = os.getenv("STUDYMATE_INFERENCE_BACKEND", "torch").strip().lower()
+INFERENCE_THREADS = int(os.getenv("STUDYMATE_INFERENCE_THREADS", "0"))        # 0 = library default
+MAX_INPUT_TOKENS = int(os.getenv("STUDYMATE_MAX_INPUT_TOKENS", "1024"))
+MODEL_SERVER = os.getenv("STUDYMATE_MODEL_SERVER", "")  # Unix socket of a shared model server; unset = load in-process
+ONNX_DIR = os.getenv("STUDYMATE_ONNX_DIR", os.path.join(os.path.expanduser("~"), ".cache", "studymate", "onnx"))
+PROMPT_HEAD_TOKENS = 64   # kept from the start of a clipped prompt: the instructions
+
+_hf_ready = False
+_hf_lock = threading.Lock()
+
+
+def _prepare_hf():
+    """Hugging Face login and seeding, done once right before the first model load instead of at startup."""
+    global _hf_ready
+    with _hf_lock:
+        if _hf_ready:
+            return
+        from transformers import set_seed
+        if INFERENCE_THREADS > 0:
+            import torch
+            torch.set_num_threads(INFERENCE_THREADS)
+        hf_token = os.getenv("HUGGINGFACE_TOKEN")
+        if hf_token:
+            from huggingface_hub import login
+            login(token=hf_token)
+        set_seed(SEED)
+        _hf_ready = True
+
+
+def _onnx_model(model_id):
+    """ONNX Runtime seq2seq model, exported once to ONNX_DIR and loaded from there afterwards."""
+    try:
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError as e:
+        raise RuntimeError("The onnx inference backend needs `pip install optimum[onnxruntime]`.") from e
+
+    options = onnxruntime.SessionOptions()
+    if INFERENCE_THREADS > 0:
+        options.intra_op_num_threads = INFERENCE_THREADS
+    export_dir = os.path.join(ONNX_DIR, model_id.replace("/", "--"))
+    if os.path.isdir(export_dir):
+        return ORTModelForSeq2SeqLM.from_pretrained(export_dir, session_options=options)
+    logger.info(f"⏳ Exporting '{model_id}' to ONNX (once, into {export_dir})...")
+    model = ORTModelForSeq2SeqLM.from_pretrained(model_id, export=True, session_options=options)
+    # Export next to the target and rename it into place, so an interrupted export is never loaded
+    os.makedirs(ONNX_DIR, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".export-", dir=ONNX_DIR)
+    try:
+        model.save_pretrained(tmp_dir)
+        os.replace(tmp_dir, export_dir)
+    except BaseException as e:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        # An OSError with export_dir in place means another process finished the same export first
+        if not (isinstance(e, OSError) and os.path.isdir(export_dir)):
+            raise
+    return model
+
+
+def load_tokenizer(model_id):
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    tokenizer.model_max_length = min(tokenizer.model_max_length, MAX_INPUT_TOKENS)
+    return tokenizer
+
+
+def build_pipeline(task, model_id, allow_gpu=False):
+    """
+    The one place where the inference backend is applied: both HF pipelines are built here.
+    Inputs are bounded to MAX_INPUT_TOKENS through the tokenizer's model_max_length, which the
+    summarizer chunks on and run_classic_prompt clips to.
+    """
+    if INFERENCE_BACKEND not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown STUDYMATE_INFERENCE_BACKEND '{INFERENCE_BACKEND}'. Use one of {INFERENCE_BACKENDS}.")
+    _prepare_hf()
+    import torch
+    from transformers import AutoModelForSeq2SeqLM, pipeline
+
+    tokenizer = load_tokenizer(model_id)
+
+    device = -1
+    if INFERENCE_BACKEND == "onnx":
+        model = _onnx_model(model_id)
+    else:
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_id)
+        if INFERENCE_BACKEND == "int8":
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        elif allow_gpu and torch.cuda.is_available():
+            device = 0
+        model.eval()
+    logger.info(f"🧮 {model_id}: {INFERENCE_BACKEND} backend, max {tokenizer.model_max_length} input tokens")
+    return pipeline(task, model=model, tokenizer=tokenizer, device=device)
+
+
+def _load_summarizer():
+    return build_pipeline("summarization", SUMMARIZER_MODEL)
+
+
+def _load_textgen():
+    return build_pipeline("text-generation", TEXTGEN_MODEL, allow_gpu=True)
+
+
+LOCAL_LOADERS = {"summarizer": _load_summarizer, "textgen": _load_textgen}
+MODEL_IDS = {"summarizer": SUMMARIZER_MODEL, "textgen": TEXTGEN_MODEL}
+
+
+def _remote_loader(name):
+    def load():
+        from model_server import remote_pipeline
+        return remote_pipeline(name, MODEL_IDS[name])
+    return load
+
+
+# === Shared registry ===
+# With STUDYMATE_MODEL_SERVER set, the same names resolve to client shims for the shared server
+model_registry = ModelRegistry()
+for _name, _loader in LOCAL_LOADERS.items():
+    if MODEL_SERVER:
+        model_registry.register(_name, _remote_loader(_name), exclusive=False)
+    else:
+        model_registry.register(_name, _loader)
+
+
+def clip_prompt(tokenizer, prompt, max_tokens):
+    """
+    Bound a prompt to max_tokens: the head (instructions) and the tail (question, "Answer:") are
+    kept and the middle of the context is dropped.
+    """
+    ids = tokenizer.encode(prompt, add_special_tokens=False)
+    if len(ids) <= max_tokens:
+        return prompt
+    head = min(PROMPT_HEAD_TOKENS, max_tokens // 4)
+    tail = max_tokens - head
+    return tokenizer.decode(ids[:head], skip_special_tokens=True) + " … " + tokenizer.decode(ids[-tail:], skip_special_tokens=True)
+
+
+def run_classic_prompt(prompt: str) -> str:
+    """Answer a prompt with the bart-large-cnn textgen pipeline, loading it on first use."""
+    with model_registry.use("textgen") as textgen, span("model.inference", model="textgen", input_chars=len(prompt)):
+        # Room for the special tokens the tokenizer adds
+        prompt = clip_prompt(textgen.tokenizer, prompt, min(textgen.tokenizer.model_max_length, MAX_INPUT_TOKENS) - 8)
+        output = textgen(prompt, max_new_tokens=256, do_sample=False)
+    return output[0]["generated_text"].strip()
+
+
+def warmup_from_env():
+    """Warm the models listed in STUDYMATE_WARMUP ("all" or a comma-separated list of names)."""
+    value = os.getenv("STUDYMATE_WARMUP", "").strip()
+    if not value:
+        return {}
+    names = None if value.lower() in ("1", "all", "true") else [n.strip() for n in value.split(",") if n.strip()]
+    return model_registry.warmup(names)
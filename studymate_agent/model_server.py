@@ -0,0 +1,371 @@
+import os
+import json
+import stat
+import time
+import queue
+import socket
+import secrets
+import tempfile
+import itertools
+import threading
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+from model_registry import ModelRegistry, MODEL_SERVER, LOCAL_LOADERS, load_tokenizer
+from tracing import logger, span
+
+# Without an explicit key the server generates one into <socket>.key (mode 0600) for local clients
+MODEL_SERVER_KEY = os.getenv("STUDYMATE_MODEL_SERVER_KEY", "")
+MODEL_SERVER_TIMEOUT = float(os.getenv("STUDYMATE_MODEL_SERVER_TIMEOUT", "300"))
+BATCH_WINDOW_MS = float(os.getenv("STUDYMATE_BATCH_WINDOW_MS", "10"))
+MAX_BATCH = int(os.getenv("STUDYMATE_MAX_BATCH", "8"))
+
+
+def default_address():
+    """models.sock in a private (0700) runtime directory: $XDG_RUNTIME_DIR/studymate or /tmp/studymate-<uid>."""
+    if MODEL_SERVER:
+        return MODEL_SERVER
+    runtime = os.getenv("XDG_RUNTIME_DIR")
+    directory = os.path.join(runtime, "studymate") if runtime else os.path.join(tempfile.gettempdir(), f"studymate-{os.getuid()}")
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.stat(directory)
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f"{directory} must be owned by this user and not accessible to others (chmod 700).")
+    return os.path.join(directory, "models.sock")
+
+
+def _key_path(address):
+    return f"{address}.key"
+
+
+def _read_key(address):
+    if MODEL_SERVER_KEY:
+        return MODEL_SERVER_KEY.encode("utf-8")
+    try:
+        with open(_key_path(address), "rb") as f:
+            info = os.fstat(f.fileno())
+            if info.st_uid != os.getuid() or info.st_mode & 0o077:
+                raise PermissionError(f"{_key_path(address)} must be owned by this user with mode 600.")
+            return f.read().strip()
+    except FileNotFoundError:
+        raise ConnectionError(
+            f"No key for the model server at {address}: set STUDYMATE_MODEL_SERVER_KEY or start the server as this user."
+        ) from None
+
+
+def _server_key(address):
+    if MODEL_SERVER_KEY:
+        return MODEL_SERVER_KEY.encode("utf-8")
+    key = secrets.token_hex(32).encode("utf-8")
+    fd = os.open(_key_path(address), os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_NOFOLLOW, 0o600)
+    os.fchmod(fd, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def _claim_address(address):
+    """Remove a stale socket left by a dead server; refuse to take over a live one or a non-socket file."""
+    try:
+        mode = os.lstat(address).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise RuntimeError(f"{address} exists and is not a socket; refusing to replace it.")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(address)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.unlink(address)
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"A model server is already running at {address}.")
+
+
+# === Server ===
+class BatchingWorker:
+    """
+    Runs one model for every connected process. Requests arriving within window_ms of each other
+    (up to max_batch inputs) are run as one pipeline call; requests with different generation
+    arguments are run as separate calls within the same window.
+    """
+
+    def __init__(self, registry, name, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH):
+        self.registry = registry
+        self.name = name
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.inputs = 0
+        threading.Thread(target=self._loop, name=f"batch-{name}", daemon=True).start()
+
+    def submit(self, inputs, kwargs, reply):
+        self.requests.put((inputs, kwargs, reply))
+
+    def _collect(self):
+        pending = [self.requests.get()]
+        size = len(pending[0][0])
+        deadline = time.monotonic() + self.window
+        while size < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            pending.append(request)
+            size += len(request[0])
+        return pending
+
+    def _loop(self):
+        while True:
+            groups = {}
+            for request in self._collect():
+                groups.setdefault(json.dumps(request[1], sort_keys=True, default=str), []).append(request)
+            for requests in groups.values():
+                self._run(requests)
+
+    def _run(self, requests):
+        inputs = [text for request_inputs, _, _ in requests for text in request_inputs]
+        kwargs = requests[0][1]
+        try:
+            with self.registry.use(self.name) as model, \
+                    span("model.batch", model=self.name, batch=len(inputs), requests=len(requests)):
+                outputs = model(inputs, batch_size=min(len(inputs), self.max_batch), **kwargs)
+        except Exception as e:
+            logger.warning(f"⚠️ Model server: {self.name} batch failed: {e}")
+            for _, _, reply in requests:
+                reply(False, f"{type(e).__name__}: {e}")
+            return
+        self.batches += 1
+        self.inputs += len(inputs)
+        start = 0
+        for request_inputs, _, reply in requests:
+            reply(True, outputs[start:start + len(request_inputs)])
+            start += len(request_inputs)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "inputs": self.inputs,
+            "mean_batch": round(self.inputs / self.batches, 2) if self.batches else None,
+            "queued": self.requests.qsize(),
+        }
+
+
+class ModelServer:
+    """
+    Serves the registry's models to other processes over a Unix socket, so a host keeps one copy
+    of the weights however many UI or batch workers it runs.
+
+    Each request is (request_id, model, inputs, kwargs); replies come back on the same connection
+    as (request_id, ok, outputs or error) as soon as their batch is done, in any order.
+    """
+
+    def __init__(self, address=None, registry=None, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH):
+        self.address = address or default_address()
+        if registry is None:
+            registry = ModelRegistry()
+            for name, loader in LOCAL_LOADERS.items():
+                registry.register(name, loader)
+        self.registry = registry
+        self.workers = {
+            name: BatchingWorker(registry, name, window_ms, max_batch) for name in registry.stats()
+        }
+        self.connections = 0
+        self._listener = None
+
+    def stats(self) -> dict:
+        models = self.registry.stats()
+        return {
+            "connections": self.connections,
+            "models": {name: dict(models[name], **worker.stats()) for name, worker in self.workers.items()},
+        }
+
+    def _handle(self, conn):
+        send_lock = threading.Lock()
+
+        def reply_to(request_id):
+            def reply(ok, payload):
+                with send_lock:
+                    try:
+                        conn.send((request_id, ok, payload))
+                    except (OSError, EOFError):
+                        pass  # the client went away; its other replies are dropped as well
+            return reply
+
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    request_id, name, inputs, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                reply = reply_to(request_id)
+                if name == "stats":
+                    reply(True, self.stats())
+                elif name not in self.workers:
+                    reply(False, f"Unknown model '{name}'. Served: {sorted(self.workers)}")
+                else:
+                    self.workers[name].submit(inputs, kwargs, reply)
+        finally:
+            self.connections -= 1
+            conn.close()
+
+    def serve_forever(self, warmup=True):
+        if warmup:
+            for name, info in self.registry.warmup().items():
+                logger.info(f"🔥 {name}: {info}")
+        _claim_address(self.address)
+        self._listener = Listener(self.address, family="AF_UNIX", authkey=_server_key(self.address))
+        os.chmod(self.address, 0o600)
+        logger.info(f"🛰️ Model server listening on {self.address}")
+        try:
+            while True:
+                try:
+                    conn = self._listener.accept()
+                except (OSError, EOFError, AuthenticationError) as e:
+                    if self._listener is None:
+                        return  # closed
+                    # A client with the wrong key, or one that hung up mid-handshake, costs only its own connection
+                    logger.warning(f"⚠️ Model server: rejected a connection: {type(e).__name__}: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            self.close()
+
+    def close(self):
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.close()
+
+
+# === Client ===
+class ModelServerClient:
+    """
+    One connection per process to the model server. Calls from any thread are multiplexed on it;
+    submit() returns a Future resolved by the reader thread when the server replies. The shared
+    key authenticates both ends, so a process squatting on the socket path gets no requests.
+    """
+
+    def __init__(self, address=None, timeout=MODEL_SERVER_TIMEOUT):
+        self.address = address or default_address()
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._pending = {}
+        self._ids = itertools.count()
+
+    def _connection(self):
+        # A forked batch worker must not share its parent's socket
+        if self._conn is None or self._pid != os.getpid():
+            try:
+                self._conn = Client(self.address, family="AF_UNIX", authkey=_read_key(self.address))
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                raise ConnectionError(
+                    f"No model server at {self.address}. Start one with `python main.py --mode serve-models`."
+                ) from e
+            except (AuthenticationError, EOFError) as e:
+                raise ConnectionError(
+                    f"Model server at {self.address} did not authenticate; check STUDYMATE_MODEL_SERVER_KEY."
+                ) from e
+            self._pid = os.getpid()
+            self._pending = {}
+            threading.Thread(target=self._read, args=(self._conn,), name="model-client", daemon=True).start()
+        return self._conn
+
+    def _read(self, conn):
+        while True:
+            try:
+                request_id, ok, payload = conn.recv()
+            except (EOFError, OSError) as e:
+                with self._lock:
+                    pending, self._pending = self._pending, {}
+                    if self._conn is conn:
+                        self._conn = None
+                for future in pending.values():
+                    future.set_exception(ConnectionError(f"Model server connection lost: {e}"))
+                return
+            with self._lock:
+                future = self._pending.pop(request_id, None)
+            if future is None:
+                continue
+            if ok:
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(f"Model server: {payload}"))
+
+    def submit(self, name, inputs, **kwargs):
+        future = Future()
+        with self._lock:
+            conn = self._connection()
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            conn.send((request_id, name, list(inputs), kwargs))
+        return future
+
+    def result(self, future):
+        """Wait for a reply, at most timeout seconds, so a stuck server cannot hang a chat turn."""
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise TimeoutError(f"No reply from the model server at {self.address} within {self.timeout:g}s") from None
+
+    def stats(self) -> dict:
+        return self.result(self.submit("stats", []))
+
+
+class RemotePipeline:
+    """
+    Stand-in for an HF pipeline served by the model server. Called like the pipeline (a single
+    input or a list); the tokenizer is loaded locally since chunking calls it for every paragraph.
+    """
+
+    def __init__(self, client, name, model_id, tokenizer_loader=load_tokenizer):
+        self.client = client
+        self.name = name
+        self.model_id = model_id
+        self._tokenizer_loader = tokenizer_loader
+        self._tokenizer = None
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            self._tokenizer = self._tokenizer_loader(self.model_id)
+        return self._tokenizer
+
+    def submit(self, inputs, **kwargs):
+        kwargs.pop("batch_size", None)  # the server batches across callers
+        return self.client.submit(self.name, [inputs] if isinstance(inputs, str) else inputs, **kwargs)
+
+    def __call__(self, inputs, **kwargs):
+        outputs = self.client.result(self.submit(inputs, **kwargs))
+        if not isinstance(inputs, str):
+            return outputs
+        # A single summarization input gives [{...}]; a single generation prompt gives [[{...}]] in batch form
+        return outputs if isinstance(outputs[0], dict) else outputs[0]
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client(address=None):
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ModelServerClient(address)
+        return _client
+
+
+def remote_pipeline(name, model_id):
+    """Loader result for model_registry when STUDYMATE_MODEL_SERVER is set."""
+    return RemotePipeline(get_client(), name, model_id)
+
+
+def serve(address=None):
+    ModelServer(address).serve_forever()
@@ -0,0 +1,110 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from doc_store import doc_store
+from tracing import logger, span
+
+PREPROCESS_WORKERS = int(os.getenv("STUDYMATE_PREPROCESS_WORKERS", "1"))
+PREPROCESS_STEPS = [
+    s.strip() for s in os.getenv("STUDYMATE_PREPROCESS_STEPS", "parse,structure,abstract,index,summary").split(",")
+    if s.strip()
+]
+MAX_JOBS = 64
+
+STEP_ICONS = {"queued": "⏸️", "running": "⏳", "done": "✅", "failed": "❌"}
+
+
+class PreprocessJob:
+    """The background steps for one document; each step's result is a Future that tools can wait on."""
+
+    def __init__(self, key, file_path, steps):
+        self.key = key
+        self.file_path = file_path
+        self.steps = steps                                   # [(name, fn(file_path))]
+        self.futures = {name: Future() for name, _ in steps}
+        self.state = {name: ("queued", None) for name, _ in steps}
+
+    def run(self):
+        for name, fn in self.steps:
+            self.state[name] = ("running", None)
+            start = time.perf_counter()
+            try:
+                with span(f"preprocess.{name}", file=os.path.basename(self.file_path)):
+                    result = fn(self.file_path)
+            except Exception as e:
+                logger.warning(f"⚠️ Preprocessing step '{name}' failed for {self.file_path}: {e}")
+                self.state[name] = ("failed", time.perf_counter() - start)
+                self.futures[name].set_exception(e)
+            else:
+                self.state[name] = ("done", time.perf_counter() - start)
+                self.futures[name].set_result(result)
+
+    def done(self):
+        return all(future.done() for future in self.futures.values())
+
+    def describe(self):
+        lines = []
+        for name, _ in self.steps:
+            status, seconds = self.state[name]
+            timing = f" ({seconds:.1f}s)" if seconds is not None else ""
+            lines.append(f"{STEP_ICONS[status]} {name}{timing}")
+        return "\n".join(lines)
+
+
+class Preprocessor:
+    """
+    Runs document preparation (parse, structure, abstract, retrieval index, summary) on a worker
+    pool as soon as a PDF is uploaded, once per document content.
+
+    Tools call result(path, step, compute): a finished or in-flight step is waited on instead of
+    being computed again; without a job (or if the step failed) compute() runs as usual.
+    """
+
+    def __init__(self, workers=1, max_jobs=MAX_JOBS):
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="preprocess")
+            return self._executor
+
+    def submit(self, file_path, steps):
+        """Start preprocessing file_path with steps ([(name, fn)]); returns the existing job for the same content."""
+        key = doc_store.content_hash(file_path)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                self._jobs.move_to_end(key)
+                return job
+            job = self._jobs[key] = PreprocessJob(key, file_path, steps)
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        self._get_executor().submit(job.run)
+        return job
+
+    def job_for(self, file_path):
+        if not file_path or not os.path.exists(file_path):
+            return None
+        key = doc_store.content_hash(file_path)
+        with self._lock:
+            return self._jobs.get(key)
+
+    def result(self, file_path, step, compute):
+        job = self.job_for(file_path)
+        future = job.futures.get(step) if job else None
+        if future is not None:
+            try:
+                return future.result()
+            except Exception:
+                pass  # already logged by the job; compute it in the caller instead
+        return compute()
+
+
+preprocessor = Preprocessor(workers=PREPROCESS_WORKERS)
@@ -0,0 +1,199 @@
+import os
+import re
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from scipy import sparse
+from doc_store import doc_store
+from model_registry import model_registry
+from tracing import logger
+
+PASSAGE_WORDS = 120
+PASSAGE_OVERLAP = 30
+TOP_K = int(os.getenv("STUDYMATE_RETRIEVAL_TOP_K", "5"))
+# facebook/bart-large-cnn reads 1024 tokens; the rest is left for the prompt template and the question
+CONTEXT_TOKEN_BUDGET = int(os.getenv("STUDYMATE_CONTEXT_TOKENS", "700"))
+EMBEDDING_MODEL = os.getenv("STUDYMATE_RETRIEVAL_EMBEDDINGS", "").strip()
+INDEX_CACHE_SIZE = 32
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "in",
+    "is", "it", "its", "of", "on", "or", "that", "the", "this", "to", "was", "were", "what", "which",
+    "who", "why", "with", "paper", "authors",
+}
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+def count_tokens(text) -> int:
+    # Use the real BART tokenizer once the model is loaded; otherwise a conservative estimate.
+    # Fast tokenizers are not thread-safe ("Already borrowed"), and taking the model's lock would
+    # wait on inference, so token counting uses its own copy under its own lock.
+    global _tokenizer
+    if not model_registry.is_loaded("textgen"):
+        return int(len(text) / 3.5) + 1
+    with _tokenizer_lock:
+        if _tokenizer is None:
+            with model_registry.use("textgen") as textgen:
+                _tokenizer = copy.deepcopy(textgen.tokenizer)
+        return len(_tokenizer.encode(text, add_special_tokens=False))
+
+
+def split_passages(pages, words=PASSAGE_WORDS, overlap=PASSAGE_OVERLAP):
+    """Overlapping word windows over each page. Returns a list of (page_number, passage_text)."""
+    passages = []
+    step = words - overlap
+    for page_number, page in enumerate(pages):
+        tokens = page.split()
+        if not tokens:
+            continue
+        for start in range(0, max(len(tokens) - overlap, 1), step):
+            passages.append((page_number, " ".join(tokens[start:start + words])))
+    return passages
+
+
+def _load_embedder():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL, device="cpu")
+
+
+if EMBEDDING_MODEL:
+    model_registry.register("embedder", _load_embedder)
+
+
+class RetrievalIndex:
+    """
+    BM25 index over the passages of one document.
+
+    The BM25 weight of every (passage, term) pair is precomputed into a sparse CSC matrix, so a
+    query only sums the columns of its terms. With STUDYMATE_RETRIEVAL_EMBEDDINGS set (and
+    sentence-transformers installed) passage embeddings are added and scores become hybrid.
+    """
+
+    def __init__(self, passages, k1=1.5, b=0.75):
+        self.pages = [page for page, _ in passages]
+        self.passages = [text for _, text in passages]
+        self.vocabulary = {}
+
+        rows, cols, counts = [], [], []
+        lengths = np.zeros(len(self.passages), dtype=np.float32)
+        for row, text in enumerate(self.passages):
+            terms = tokenize(text)
+            lengths[row] = len(terms)
+            tf = {}
+            for term in terms:
+                col = self.vocabulary.setdefault(term, len(self.vocabulary))
+                tf[col] = tf.get(col, 0) + 1
+            rows.extend([row] * len(tf))
+            cols.extend(tf.keys())
+            counts.extend(tf.values())
+
+        shape = (len(self.passages), len(self.vocabulary))
+        tf = sparse.csr_matrix((np.asarray(counts, dtype=np.float32), (rows, cols)), shape=shape)
+
+        n = max(len(self.passages), 1)
+        df = np.bincount(tf.indices, minlength=shape[1]).astype(np.float32)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        avgdl = lengths.mean() if len(lengths) else 1.0
+        norm = k1 * (1 - b + b * lengths / max(avgdl, 1e-6))
+
+        weights = tf.copy()
+        row_of_value = np.repeat(np.arange(shape[0]), np.diff(tf.indptr))
+        weights.data = idf[tf.indices] * tf.data * (k1 + 1) / (tf.data + norm[row_of_value])
+        self.weights = weights.tocsc()
+
+        self.embeddings = None
+        if EMBEDDING_MODEL and self.passages:
+            try:
+                embedder = model_registry.get("embedder")
+                self.embeddings = np.asarray(
+                    embedder.encode(self.passages, batch_size=32, normalize_embeddings=True), dtype=np.float32
+                )
+            except ImportError:
+                logger.warning("⚠️ sentence-transformers is not installed; using BM25 only.")
+
+    def scores(self, question):
+        cols = [self.vocabulary[t] for t in set(tokenize(question)) if t in self.vocabulary]
+        if cols:
+            scores = np.asarray(self.weights[:, cols].sum(axis=1)).ravel()
+        else:
+            scores = np.zeros(len(self.passages), dtype=np.float32)
+        if self.embeddings is not None:
+            query = np.asarray(
+                model_registry.get("embedder").encode([question], normalize_embeddings=True), dtype=np.float32
+            )[0]
+            top = scores.max()
+            scores = (scores / top if top > 0 else scores) + self.embeddings @ query
+        return scores
+
+    def search(self, question, k=TOP_K):
+        """Return [(passage_index, score)] for the k best passages, best first."""
+        if not self.passages:
+            return []
+        scores = self.scores(question)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
+
+    def select_context(self, question, k=TOP_K, token_budget=CONTEXT_TOKEN_BUDGET):
+        """
+        Best passages for the question that together fit in token_budget, in document order.
+        Falls back to the opening passages when nothing in the document matches the question.
+        """
+        ranked = [i for i, _ in self.search(question, k=max(k * 3, k))]
+        if not ranked:
+            ranked = list(range(len(self.passages)))
+
+        chosen, used = [], 0
+        for i in ranked:
+            cost = count_tokens(self.passages[i])
+            if used + cost > token_budget:
+                continue
+            chosen.append(i)
+            used += cost
+            if len(chosen) == k:
+                break
+        return [self.passages[i] for i in sorted(chosen)]
+
+
+# === Per-document index cache ===
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def _cached_index(key, build):
+    with _lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+    index = build()
+    with _lock:
+        _indexes[key] = index
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+def get_pdf_index(file_path):
+    """Retrieval index for a PDF, built once per document content. None if the file does not exist."""
+    pages = doc_store.get_pages(file_path)
+    if pages is None:
+        return None
+    key = ("pdf", doc_store.content_hash(file_path))
+    return _cached_index(key, lambda: RetrievalIndex(split_passages(pages)))
+
+
+def get_text_index(text):
+    key = ("text", hashlib.sha256(text.encode("utf-8")).hexdigest())
+    return _cached_index(key, lambda: RetrievalIndex(split_passages([text])))
@@ -0,0 +1,139 @@
+import os
+import re
+from translation import langs
+from artifacts import ARTIFACT_THRESHOLD_CHARS
+
+ROUTER_ENABLED = os.getenv("STUDYMATE_ROUTER", "1").lower() not in ("0", "false", "off", "")
+ROUTER_MIN_CONFIDENCE = float(os.getenv("STUDYMATE_ROUTER_MIN_CONFIDENCE", "0.8"))
+
+# Tools whose output is the answer when the model calls them: it goes to the user as-is, without
+# another model round. Opt-in, since most tools are also intermediate steps ("summarize, then
+# translate the summary"); routed requests are always answered directly.
+RETURN_DIRECT_TOOLS = {
+    name.strip() for name in os.getenv("STUDYMATE_RETURN_DIRECT", "").split(",") if name.strip()
+}
+
+PDF_PATH = re.compile(r'"([^"]+\.pdf)"|(\S+\.pdf)\b', re.IGNORECASE)
+FILE_NOTE = re.compile(r'\s*The file is called "[^"]*"\.\s*$')
+QUOTED = re.compile(r'"([^"]{2,})"|“([^”]{2,})”|(?:^|\s)\'([^\']{2,})\'(?=[\s.,!?]|$)')
+
+SUMMARIZE = re.compile(r"\b(summari[sz]e|summary|sum up|tl;?dr|key points)\b", re.IGNORECASE)
+ABSTRACT = re.compile(r"\babstract\b", re.IGNORECASE)
+TRANSLATE = re.compile(r"\btranslat(e|ion)\b", re.IGNORECASE)
+SIMILAR = re.compile(r"\b(similar|related)\s+(papers?|articles?|work|studies|publications)\b", re.IGNORECASE)
+SECTION = re.compile(
+    r"\b(?:section\s+(\d+(?:\.\d+)*)|the\s+(introduction|conclusions?|discussion|results|method(?:s|ology)?|related work|experiments))\b",
+    re.IGNORECASE,
+)
+TARGET_LANGUAGE = re.compile(r"\b(?:to|into|in)\s+([a-z]+(?:\s+\([a-z]+\))?)", re.IGNORECASE)
+# Questions about the document ("does it have a summary table?") are for the model; polite
+# commands ("could you summarize ...?") are not questions
+POLITE = re.compile(r"^\s*(?:please\s+)?(?:can|could|would|will)\s+you\b", re.IGNORECASE)
+QUESTION = re.compile(
+    r"^\s*(?:does|do|did|is|are|was|were|has|have|had|what|which|who|whose|why|how|when|where)\b|\?\s*$",
+    re.IGNORECASE,
+)
+
+
+class FromTool:
+    """A routed argument that is the output of another tool, e.g. the abstract for search_similar."""
+
+    def __init__(self, tool, params):
+        self.tool = tool
+        self.params = params
+
+
+class Route:
+    def __init__(self, tool, params, confidence, rule):
+        self.tool = tool
+        self.params = params
+        self.confidence = confidence
+        self.rule = rule
+
+    def __repr__(self):
+        return f"Route({self.tool}, {self.params}, confidence={self.confidence}, rule={self.rule})"
+
+
+def _target_language(text):
+    for match in TARGET_LANGUAGE.finditer(text):
+        name = match.group(1).lower()
+        if name in langs:
+            return name
+    return None
+
+
+def route(text, available):
+    """
+    Pick a tool for an unambiguous request without asking the model, or return None.
+
+    Only one intent may match, without qualifiers the matched tool cannot honour (a target
+    language for a summary, a section for a translation); anything mixed ("summarize and
+    translate"), phrased as a question or not clearly about the uploaded document is left to the
+    agent loop.
+    """
+    match = PDF_PATH.search(text)
+    pdf = (match.group(1) or match.group(2)) if match else None
+    request = FILE_NOTE.sub("", text).strip()
+    if pdf:
+        request = request.replace(f'"{pdf}"', "").replace(pdf, "").strip()
+
+    intents = {
+        "summarize": bool(SUMMARIZE.search(request)),
+        "translate": bool(TRANSLATE.search(request)),
+        "similar": bool(SIMILAR.search(request)),
+    }
+    # "summarize the abstract" is a summary; "what is the abstract" is abstract extraction
+    intents["abstract"] = bool(ABSTRACT.search(request)) and not any(intents.values())
+    matched = [name for name, hit in intents.items() if hit]
+    if len(matched) != 1 or len(request.split()) > 40:
+        return None
+    if QUESTION.search(request) and not POLITE.match(request):
+        return None
+    intent = matched[0]
+
+    candidates = []
+    if intent == "summarize" and pdf:
+        if _target_language(request):
+            return None  # a summary in another language takes two tools
+        section = SECTION.search(request)
+        params = {"pdf_path": pdf}
+        if section:
+            params["section"] = section.group(1) or section.group(2).lower()
+        elif ABSTRACT.search(request):
+            params["section"] = "abstract"
+        candidates.append(Route("summarize_pdf", params, 0.95, "summarize"))
+    elif intent == "abstract" and pdf:
+        candidates.append(Route("abstract_from_pdf", {"filepath": pdf}, 0.9, "abstract"))
+    elif intent == "translate":
+        if ABSTRACT.search(request) or SECTION.search(request):
+            return None  # only part of the document: extract it first, which the model does
+        language = _target_language(request)
+        quoted = QUOTED.search(request)
+        if language and quoted:
+            text_to_translate = next(g for g in quoted.groups() if g)
+            candidates.append(Route("translate_text", {"text": text_to_translate, "language": language}, 0.9, "translate_text"))
+        elif language and pdf:
+            candidates.append(Route("translate_pdf", {"filepath": pdf, "language": language}, 0.9, "translate_pdf"))
+    elif intent == "similar" and pdf:
+        params = {"abstract": FromTool("abstract_from_pdf", {"filepath": pdf})}
+        candidates.append(Route("search_similar", params, 0.85, "similar"))
+
+    for candidate in candidates:
+        needed = [candidate.tool] + [v.tool for v in candidate.params.values() if isinstance(v, FromTool)]
+        if candidate.confidence >= ROUTER_MIN_CONFIDENCE and all(name in available for name in needed):
+            return candidate
+    return None
+
+
+def direct_reply(results):
+    """
+    The assistant reply for return-direct tool results: the outputs themselves, or for results
+    stored as artifacts a pointer to the full text attached below.
+    """
+    parts = []
+    for name, result in results:
+        if isinstance(result, str) and len(result) > ARTIFACT_THRESHOLD_CHARS:
+            parts.append(f"📎 The full output of `{name}` is attached below.")
+        else:
+            parts.append(str(result))
+    return "\n\n".join(parts)
@@ -11,6 +11,12 @@ from tools import (
 from agent_loop import agent_loop
 from functools import partial, update_wrapper
 
+# System message for every prompt-mode conversation (CLI and batch)
+SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "Only call functions using their defined parameters. For example, use `abstract`, not `query`, for search_similar."
+}
+
 def run_prompt(conversation, run_classic_prompt, client, model):
     
     anstxt = partial(answering_text, run_classic_prompt=run_classic_prompt)
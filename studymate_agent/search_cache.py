@@ -0,0 +1,129 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import Future
+
+SEARCH_CACHE_PATH = os.getenv(
+    "STUDYMATE_SEARCH_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "studymate", "search.sqlite")
+)
+SEARCH_CACHE_TTL = float(os.getenv("STUDYMATE_SEARCH_CACHE_TTL", str(7 * 24 * 3600)))
+SEARCH_CACHE_SIZE = int(os.getenv("STUDYMATE_SEARCH_CACHE_SIZE", "2000"))
+
+
+def normalize_query(query):
+    """Case, punctuation and whitespace differences should not cause a new upstream request."""
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+
+class SearchCache:
+    """
+    SQLite-backed cache of structured search results keyed by (engine, normalized query).
+
+    Entries older than ttl_seconds are ignored and purged; beyond max_entries the least
+    recently written entries are evicted. Concurrent lookups of the same key share one fetch.
+    path=":memory:" (or an empty path) keeps the cache for the life of the process only.
+    The database is opened on first use, so importing the module touches no files.
+    """
+
+    def __init__(self, path=SEARCH_CACHE_PATH, ttl_seconds=SEARCH_CACHE_TTL, max_entries=SEARCH_CACHE_SIZE):
+        self.path = path or ":memory:"
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._conn = None
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @property
+    def _db(self):
+        # Callers hold self._lock
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, query TEXT, payload TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS results_created ON results(created)")
+            self._conn = db
+        return self._conn
+
+    @staticmethod
+    def key(engine, query):
+        return hashlib.sha256(f"{engine}\n{normalize_query(query)}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT payload, created FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return None
+        return json.loads(row[0])
+
+    def put(self, key, query, results):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, query, payload, created) VALUES (?, ?, ?, ?)",
+                (key, normalize_query(query), json.dumps(results, ensure_ascii=False), now),
+            )
+            self._db.execute("DELETE FROM results WHERE created < ?", (now - self.ttl_seconds,))
+            self._db.execute(
+                "DELETE FROM results WHERE key IN "
+                "(SELECT key FROM results ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def lookup(self, engine, query, fetch):
+        """
+        Return the cached results for (engine, query), or call fetch() once — however many
+        threads ask at the same time — and cache what it returns. Failures are not cached.
+        """
+        key = self.key(engine, query)
+        results = self.get(key)
+        if results is not None:
+            with self._lock:
+                self.hits += 1
+            return results
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            results = fetch()
+            self.put(key, query, results)
+            future.set_result(results)
+            return results
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM results")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced, "entries": entries}
+
+
+search_cache = SearchCache()
@@ -0,0 +1,277 @@
+import os
+import re
+import json
+import threading
+from collections import Counter, OrderedDict
+from doc_store import doc_store, iter_pdf_pages, _open_pdf
+from tracing import span
+
+STRUCTURE_CACHE_SIZE = 32
+HEADING_MIN_RATIO = 1.15   # a line set this much larger than the body text is a heading candidate
+HEADING_MAX_WORDS = 12
+ABSTRACT_SEARCH_PAGES = 3
+
+NUMBERED_HEADING = re.compile(r"^((?:\d+(?:\.\d+)*)|(?:[IVX]+))\.?\s+(\S.*)$")
+REFERENCE_TITLES = {"references", "bibliography", "works cited", "literature cited"}
+
+
+def normalize_title(title):
+    return " ".join(re.sub(r"[^\w\s]", " ", title.lower()).split())
+
+
+def singular(title):
+    """Drop one plural "s" ("results" -> "result"), leaving "analysis", "class", "corpus" alone."""
+    return title[:-1] if title.endswith("s") and not title.endswith(("ss", "is", "us")) else title
+
+
+# How a question points at a section: "in the conclusion", "the results section", "section 3"
+SECTION_REFERENCE = r"(?:\b(?:in|of|from|according to)\s+the\s+{name}\b|\bthe\s+{name}\s+section\b|\bsection\s+{name}\b)"
+
+
+class DocumentStructure:
+    """
+    Section headings of one PDF with their position, plus the abstract and references spans.
+
+    Positions are (page, offset) pairs into the per-page text the doc_store returns, so a
+    section's text is read back from just the pages it covers. Sections are looked up by number
+    ("3", "section 3.1"), by title ("conclusion") or as "abstract" / "references" in O(1).
+    """
+
+    def __init__(self, sections, page_count, abstract=None, references=None):
+        self.sections = sections          # [{"number", "title", "level", "page", "offset", "end"}]
+        self.page_count = page_count
+        self.abstract = abstract          # {"start": [page, offset], "end": [page, offset]} or None
+        self.references = references
+        self._keys = {}
+        for i, section in enumerate(sections):
+            for key in self._section_keys(section):
+                self._keys.setdefault(key, i)
+
+    @staticmethod
+    def _section_keys(section):
+        title = normalize_title(section["title"])
+        keys = [title, singular(title)]
+        if section["number"]:
+            keys += [section["number"], f"section {section['number']}"]
+        return keys
+
+    def find(self, name):
+        """The span of section name ("3", "section 2.1", "conclusion", "abstract", "references"), or None."""
+        key = normalize_title(name)
+        if key == "abstract":
+            return self.abstract
+        if key in REFERENCE_TITLES:
+            return self.references
+        index = self._keys.get(key, self._keys.get(singular(key)))
+        if index is None:
+            return None
+        section = self.sections[index]
+        return {"start": [section["page"], section["offset"]], "end": section["end"]}
+
+    def mentioned_in(self, text):
+        """
+        The section text explicitly points at ("section 3", "in the conclusion", "the methods
+        section"), or None. Section titles used as plain words ("what results did they get?")
+        do not count.
+        """
+        words = normalize_title(text)
+        match = re.search(r"\bsection (\d+(?:\.\d+)*)\b", words)
+        if match and match.group(1) in self._keys:
+            return match.group(1)
+        if self.abstract and re.search(SECTION_REFERENCE.format(name="abstract"), words):
+            return "abstract"
+        for section in self.sections:
+            title = normalize_title(section["title"])
+            if title and re.search(SECTION_REFERENCE.format(name=f"{re.escape(singular(title))}s?"), words):
+                return title
+        return None
+
+    def body_end(self):
+        """Where the main text ends: the start of the references, or the end of the document."""
+        return self.references["start"] if self.references else [self.page_count, 0]
+
+    def to_dict(self):
+        return {
+            "sections": self.sections,
+            "page_count": self.page_count,
+            "abstract": self.abstract,
+            "references": self.references,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["sections"], data["page_count"], data.get("abstract"), data.get("references"))
+
+
+# === Building ===
+def _heading_lines(file_path, stop=None):
+    """
+    One pass over the PDF's text spans (pages before stop). Returns the heading lines as [(page, offset, size, text)],
+    offsets being into the page's plain text, and the page count. Headings are short lines set
+    larger than the body text (the most common size), or bold and numbered.
+    """
+    sizes = Counter()
+    candidates = []
+    with _open_pdf(file_path) as doc:
+        page_count = doc.page_count if stop is None else min(stop, doc.page_count)
+        for number in range(page_count):
+            page = doc.load_page(number)
+            plain = page.get_text()
+            cursor = 0
+            for block in page.get_text("dict")["blocks"]:
+                for line in block.get("lines", []):
+                    spans = [s for s in line["spans"] if s["text"].strip()]
+                    if not spans:
+                        continue
+                    text = "".join(s["text"] for s in line["spans"]).strip()
+                    size = round(max(s["size"] for s in spans), 1)
+                    sizes[size] += len(text)
+                    if len(text.split()) > HEADING_MAX_WORDS:
+                        continue
+                    offset = plain.find(text, cursor)
+                    if offset < 0:
+                        continue
+                    cursor = offset + len(text)
+                    bold = all(s["flags"] & 16 for s in spans)
+                    candidates.append((number, offset, size, bold, text))
+    body_size = sizes.most_common(1)[0][0] if sizes else 0
+    headings = [
+        (page, offset, size, text) for page, offset, size, bold, text in candidates
+        if size >= body_size * HEADING_MIN_RATIO or (bold and NUMBERED_HEADING.match(text))
+    ]
+    return headings, page_count
+
+
+def build_structure(file_path, stop=None):
+    """Scan the PDF (or its first stop pages) for headings and derive sections, abstract and references."""
+    headings, page_count = _heading_lines(file_path, stop)
+
+    # The largest text on the first page is the paper title, not a section
+    first_page = [size for page, _, size, _ in headings if page == 0]
+    if first_page and headings[0][2] == max(first_page):
+        headings = [h for h in headings if not (h[0] == 0 and h[2] == headings[0][2])]
+
+    sections = []
+    for page, offset, size, text in headings:
+        match = NUMBERED_HEADING.match(text)
+        number, title = (match.group(1), match.group(2).strip()) if match else (None, text)
+        sections.append({
+            "number": number,
+            "title": title,
+            "level": number.count(".") + 1 if number else 1,
+            "page": page,
+            "offset": offset,
+            "heading_length": len(text),
+        })
+
+    # A section runs until the next heading at the same or a higher level
+    for i, section in enumerate(sections):
+        section["end"] = next(
+            ([f["page"], f["offset"]] for f in sections[i + 1:] if f["level"] <= section["level"]),
+            [page_count, 0],
+        )
+
+    abstract = references = None
+    for i, section in enumerate(sections):
+        title = normalize_title(section["title"])
+        if abstract is None and title == "abstract":
+            # The abstract stops at the very next heading, whatever its level
+            end = [sections[i + 1]["page"], sections[i + 1]["offset"]] if i + 1 < len(sections) else section["end"]
+            abstract = {"start": [section["page"], section["offset"] + section["heading_length"]], "end": end}
+        elif title in REFERENCE_TITLES:
+            references = {"start": [section["page"], section["offset"]], "end": section["end"]}
+    sections = [s for s in sections if normalize_title(s["title"]) != "abstract"]
+
+    if abstract is None:
+        abstract = _inline_abstract(file_path, sections)
+
+    return DocumentStructure(sections, page_count, abstract, references)
+
+
+def _inline_abstract(file_path, sections):
+    # Papers that run "Abstract—We propose ..." into the body text have no abstract heading
+    for page, text in enumerate(iter_pdf_pages(file_path, 0, ABSTRACT_SEARCH_PAGES)):
+        match = re.search(r"(?i)\babstract\b\s*[:.\-—–]?\s*", text)
+        if match:
+            end = next(([s["page"], s["offset"]] for s in sections if (s["page"], s["offset"]) > (page, match.end())), None)
+            return {"start": [page, match.end()], "end": end or [page + 1, 0]}
+    return None
+
+
+# === Cached access ===
+_structures = OrderedDict()
+_lock = threading.Lock()
+
+
+def _disk_path(key):
+    return doc_store.cache_dir / f"{key}.structure.json" if doc_store.cache_dir else None
+
+
+def get_structure(file_path, build=True):
+    """
+    Structure index for a PDF, built once per document content. None if the file does not exist,
+    or with build=False if it has not been built yet.
+    """
+    if not os.path.exists(file_path):
+        return None
+    key = doc_store.content_hash(file_path)
+    with _lock:
+        structure = _structures.get(key)
+        if structure is not None:
+            _structures.move_to_end(key)
+            return structure
+
+    path = _disk_path(key)
+    if path is not None and path.exists():
+        structure = DocumentStructure.from_dict(json.loads(path.read_text(encoding="utf-8")))
+    elif not build:
+        return None
+    else:
+        with span("pdf.structure", file=os.path.basename(file_path)) as structure_span:
+            structure = build_structure(file_path)
+            structure_span.set(sections=len(structure.sections), pages=structure.page_count)
+        if path is not None:
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_text(json.dumps(structure.to_dict()), encoding="utf-8")
+            os.replace(tmp_path, path)
+
+    with _lock:
+        _structures[key] = structure
+        while len(_structures) > STRUCTURE_CACHE_SIZE:
+            _structures.popitem(last=False)
+    return structure
+
+
+def abstract_span(file_path):
+    """
+    The abstract's span. Uses the full index when it is already built; otherwise only the first
+    pages are scanned, since that is where the abstract is.
+    """
+    structure = get_structure(file_path, build=False)
+    if structure is None and os.path.exists(file_path):
+        structure = build_structure(file_path, stop=ABSTRACT_SEARCH_PAGES)
+    return structure.abstract if structure else None
+
+
+def iter_span(file_path, start, end):
+    """Per-page text between two (page, offset) positions, reading only the pages in between."""
+    (start_page, start_offset), (end_page, end_offset) = start, end
+    for page, text in enumerate(iter_pdf_pages(file_path, start_page, end_page + 1), start_page):
+        lo = start_offset if page == start_page else 0
+        hi = end_offset if page == end_page else len(text)
+        yield text[lo:hi]
+
+
+def read_span(file_path, start, end):
+    return "".join(iter_span(file_path, start, end)).strip()
+
+
+def section_text(file_path, name):
+    """Text of one section of a PDF ("3", "conclusion", "abstract", ...), or None if there is no such section."""
+    structure = get_structure(file_path)
+    found = structure.find(name) if structure else None
+    return read_span(file_path, found["start"], found["end"]) if found else None
+
+
+def section_names(structure):
+    return [f"{s['number']}. {s['title']}" if s["number"] else s["title"] for s in structure.sections]
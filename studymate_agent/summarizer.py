@@ -0,0 +1,189 @@
+import os
+import re
+import copy
+import itertools
+import threading
+from model_registry import model_registry
+from utils import emit_progress
+from tracing import span
+
+SUMMARY_BATCH_SIZE = int(os.getenv("STUDYMATE_SUMMARY_BATCH_SIZE", "4"))
+MAP_SUMMARY_TOKENS = 160      # max length of each partial summary
+FINAL_SUMMARY_TOKENS = 512    # max length of the final summary (same as before)
+PASSTHROUGH_TOKENS = 60       # chunks this short are kept as-is instead of summarized
+MAX_REDUCE_ROUNDS = 6
+
+
+def max_input_tokens(tokenizer) -> int:
+    limit = getattr(tokenizer, "model_max_length", None) or 1024
+    if limit > 100_000:  # tokenizers without a configured limit report a huge sentinel
+        limit = 1024
+    # Leave room for the BOS/EOS tokens the pipeline adds
+    return limit - 8
+
+
+def _split_units(text):
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = re.sub(r"-\n(?=\w)", "", paragraph)
+        paragraph = re.sub(r"\s+", " ", paragraph).strip()
+        if paragraph:
+            yield paragraph
+
+
+def _split_sentences(text):
+    return [s for s in re.split(r"(?<=[.!?])\s+", text) if s]
+
+
+def iter_chunks_by_tokens(texts, tokenizer, max_tokens):
+    """
+    Pack texts into chunks of at most max_tokens summarizer tokens, yielding (chunk_text, token_count)
+    as soon as each chunk is full, so texts may be a lazy page stream.
+    Paragraphs are kept whole when they fit, otherwise split into sentences,
+    and sentences that are still too long are cut on token boundaries.
+    """
+    def count(text):
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    current, current_tokens = [], 0
+
+    def units():
+        for text in texts:
+            for paragraph in _split_units(text):
+                n = count(paragraph)
+                if n <= max_tokens:
+                    yield paragraph, n
+                    continue
+                for sentence in _split_sentences(paragraph):
+                    n = count(sentence)
+                    if n <= max_tokens:
+                        yield sentence, n
+                        continue
+                    ids = tokenizer.encode(sentence, add_special_tokens=False)
+                    for start in range(0, len(ids), max_tokens):
+                        piece = ids[start:start + max_tokens]
+                        yield tokenizer.decode(piece, skip_special_tokens=True), len(piece)
+
+    for unit, n in units():
+        # +1 for the joining space
+        if current and current_tokens + n + 1 > max_tokens:
+            yield " ".join(current), current_tokens
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += n + (1 if len(current) > 1 else 0)
+    if current:
+        yield " ".join(current), current_tokens
+
+
+def chunk_by_tokens(texts, tokenizer, max_tokens):
+    """List version of iter_chunks_by_tokens: returns [(chunk_text, token_count)]."""
+    return list(iter_chunks_by_tokens(texts, tokenizer, max_tokens))
+
+
+def _run_batches(texts, batch_size, progress_label=None, first_number=1, total=None, **generate_kwargs):
+    summaries = []
+    total = total or len(texts)
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        with model_registry.use("summarizer") as summarizer, span("model.inference", model="summarizer", batch=len(batch)):
+            outputs = summarizer(batch, batch_size=batch_size, truncation=True, do_sample=False, **generate_kwargs)
+        summaries.extend(out["summary_text"].strip() for out in outputs)
+        if progress_label:
+            for number, summary in enumerate(summaries[start:], first_number + start):
+                emit_progress(f"{progress_label} {number}/{total}: {summary}")
+    return summaries
+
+
+class _ChunkingTokenizer:
+    """
+    Private copy of the summarizer's tokenizer for chunking. Fast tokenizers are not thread-safe
+    ("Already borrowed"), and the pipeline's own one is in use during inference, so chunking
+    never touches it; calls on the copy are serialized by its own lock.
+    """
+
+    def __init__(self, tokenizer):
+        self._tokenizer = copy.deepcopy(tokenizer)
+        self._lock = threading.Lock()
+        self.model_max_length = tokenizer.model_max_length
+
+    def encode(self, text, **kwargs):
+        with self._lock:
+            return self._tokenizer.encode(text, **kwargs)
+
+    def decode(self, ids, **kwargs):
+        with self._lock:
+            return self._tokenizer.decode(ids, **kwargs)
+
+
+_chunking_tokenizer = None
+_chunking_tokenizer_lock = threading.Lock()
+
+
+def _tokenizer():
+    global _chunking_tokenizer
+    with _chunking_tokenizer_lock:
+        if _chunking_tokenizer is None:
+            with model_registry.use("summarizer") as summarizer:
+                _chunking_tokenizer = _ChunkingTokenizer(summarizer.tokenizer)
+        return _chunking_tokenizer
+
+
+def _chunk(texts):
+    tokenizer = _tokenizer()
+    return chunk_by_tokens(texts, tokenizer, max_input_tokens(tokenizer))
+
+
+def _map_stream(texts, batch_size):
+    """
+    First map round over a lazy stream of texts: chunks are summarized a batch at a time as the
+    stream produces them, so only the (much shorter) partial summaries are kept.
+    Returns (chunks, rounds) for the reduce loop.
+    """
+    tokenizer = _tokenizer()
+    chunks = iter_chunks_by_tokens(texts, tokenizer, max_input_tokens(tokenizer))
+    window = list(itertools.islice(chunks, batch_size + 1))
+    if len(window) <= batch_size:
+        return window, 0  # short document: the reduce loop handles it like a list
+
+    partials, number = [], 1
+    while window:
+        to_summarize = [text for text, n in window if n > PASSTHROUGH_TOKENS]
+        summaries = iter(_run_batches(
+            to_summarize, batch_size, "Partial summary", first_number=number, total="…",
+            max_length=MAP_SUMMARY_TOKENS, min_length=30,
+        ))
+        number += len(to_summarize)
+        partials.extend(next(summaries) if n > PASSTHROUGH_TOKENS else text for text, n in window)
+        window = list(itertools.islice(chunks, batch_size))
+    return _chunk(partials), 1
+
+
+def summarize_document(texts, batch_size=None) -> str:
+    """
+    Map-reduce summary of texts (e.g. PDF pages). texts may be a list or a lazy iterator.
+
+    Map: the texts are re-chunked on the summarizer's token limit and summarized in batches.
+    Reduce: partial summaries are re-chunked and summarized again until they fit in a single
+    input, which then gets the final pass. Nothing is truncated along the way.
+    """
+    batch_size = batch_size or SUMMARY_BATCH_SIZE
+    if isinstance(texts, (list, tuple)):
+        chunks, rounds = _chunk(texts), 0
+    else:
+        chunks, rounds = _map_stream(texts, batch_size)
+    if not chunks:
+        return ""
+
+    while len(chunks) > 1 and rounds < MAX_REDUCE_ROUNDS:
+        passthrough = PASSTHROUGH_TOKENS if any(n > PASSTHROUGH_TOKENS for _, n in chunks) else 0
+        to_summarize = [text for text, n in chunks if n > passthrough]
+        label = "Partial summary" if rounds == 0 else f"Reduce round {rounds}"
+        summaries = iter(_run_batches(to_summarize, batch_size, label, max_length=MAP_SUMMARY_TOKENS, min_length=30))
+        partials = [next(summaries) if n > passthrough else text for text, n in chunks]
+        chunks = _chunk(partials)
+        rounds += 1
+
+    # Several chunks only remain here if reduction stopped converging; the pipeline truncates then
+    final_text = " ".join(text for text, _ in chunks)
+    final_tokens = sum(n for _, n in chunks)
+    min_length = min(30, max(final_tokens // 2, 1))
+    return _run_batches([final_text], 1, max_length=FINAL_SUMMARY_TOKENS, min_length=min_length)[0]
@@ -1,39 +1,46 @@
 import re
-import json
+import itertools
 from pathlib import Path
-from deep_translator import GoogleTranslator
-from llama_index.readers.file import PyMuPDFReader
-from utils import load_pdf_chunks, split_text
-from serpapi import GoogleSearch
-from transformers import pipeline
+from utils import split_text
+from doc_store import get_pdf_pages, iter_pdf_pages
+from summarizer import summarize_document
+from translation import resolve_language, translate_segments
+from retrieval import get_pdf_index, get_text_index
+from search_cache import search_cache
+from structure import get_structure, abstract_span, iter_span, read_span, section_text, section_names
+from preprocess import preprocessor, PREPROCESS_STEPS
+from model_registry import run_classic_prompt as default_classic_prompt
+from tracing import logger
+
+ABSTRACT_PAGES = 3          # pages searched for the abstract
+TRANSLATE_PAGE_WINDOW = 16  # pages split and translated together
 
 def extract_text_from_pdf(file_path: str) -> list:
-    if not Path(file_path).exists():
+    pages = get_pdf_pages(file_path)
+    if pages is None:
         return ["File not found."]
-    reader = PyMuPDFReader()
-    docs = reader.load(file_path=file_path)
-    return "\n".join([doc.text for doc in docs])
+    return "\n".join(pages)
 
-langs = {'afrikaans': 'af', 'albanian': 'sq', 'amharic': 'am', 'arabic': 'ar', 'armenian': 'hy', 'assamese': 'as', 'aymara': 'ay', 'azerbaijani': 'az', 'bambara': 'bm', 'basque': 'eu', 'belarusian': 'be', 'bengali': 'bn', 'bhojpuri': 'bho', 'bosnian': 'bs', 'bulgarian': 'bg', 'catalan': 'ca', 'cebuano': 'ceb', 'chichewa': 'ny', 'chinese (simplified)': 'zh-CN', 'chinese (traditional)': 'zh-TW', 'corsican': 'co', 'croatian': 'hr', 'czech': 'cs', 'danish': 'da', 'dhivehi': 'dv', 'dogri': 'doi', 'dutch': 'nl', 'english': 'en', 'esperanto': 'eo', 'estonian': 'et', 'ewe': 'ee', 'filipino': 'tl', 'finnish': 'fi', 'french': 'fr', 'frisian': 'fy', 'galician': 'gl', 'georgian': 'ka', 'german': 'de', 'greek': 'el', 'guarani': 'gn', 'gujarati': 'gu', 'haitian creole': 'ht', 'hausa': 'ha', 'hawaiian': 'haw', 'hebrew': 'iw', 'hindi': 'hi', 'hmong': 'hmn', 'hungarian': 'hu', 'icelandic': 'is', 'igbo': 'ig', 'ilocano': 'ilo', 'indonesian': 'id', 'irish': 'ga', 'italian': 'it', 'japanese': 'ja', 'javanese': 'jw', 'kannada': 'kn', 'kazakh': 'kk', 'khmer': 'km', 'kinyarwanda': 'rw', 'konkani': 'gom', 'korean': 'ko', 'krio': 'kri', 'kurdish (kurmanji)': 'ku', 'kurdish (sorani)': 'ckb', 'kyrgyz': 'ky', 'lao': 'lo', 'latin': 'la', 'latvian': 'lv', 'lingala': 'ln', 'lithuanian': 'lt', 'luganda': 'lg', 'luxembourgish': 'lb', 'macedonian': 'mk', 'maithili': 'mai', 'malagasy': 'mg', 'malay': 'ms', 'malayalam': 'ml', 'maltese': 'mt', 'maori': 'mi', 'marathi': 'mr', 'meiteilon (manipuri)': 'mni-Mtei', 'mizo': 'lus', 'mongolian': 'mn', 'myanmar': 'my', 'nepali': 'ne', 'norwegian': 'no', 'odia (oriya)': 'or', 'oromo': 'om', 'pashto': 'ps', 'persian': 'fa', 'polish': 'pl', 'portuguese': 'pt', 'punjabi': 'pa', 'quechua': 'qu', 'romanian': 'ro', 'russian': 'ru', 'samoan': 'sm', 'sanskrit': 'sa', 'scots gaelic': 'gd', 'sepedi': 'nso', 'serbian': 'sr', 'sesotho': 'st', 'shona': 'sn', 'sindhi': 'sd', 'sinhala': 'si', 'slovak': 'sk', 'slovenian': 'sl', 'somali': 'so', 'spanish': 'es', 'sundanese': 'su', 'swahili': 'sw', 'swedish': 'sv', 'tajik': 'tg', 'tamil': 'ta', 'tatar': 'tt', 'telugu': 'te', 'thai': 'th', 'tigrinya': 'ti', 'tsonga': 'ts', 'turkish': 'tr', 'turkmen': 'tk', 'twi': 'ak', 'ukrainian': 'uk', 'urdu': 'ur', 'uyghur': 'ug', 'uzbek': 'uz', 'vietnamese': 'vi', 'welsh': 'cy', 'xhosa': 'xh', 'yiddish': 'yi', 'yoruba': 'yo', 'zulu': 'zu'}
 def translate_text(text: str, language: str) -> str:
-    language = language.lower()
-    
-    language = langs.get(language, language)
-    return GoogleTranslator(target=language).translate(text)
+    language = resolve_language(language)
+    return "\n\n".join(translate_segments(split_text(text), language))
 
 def translate_pdf(filepath: str, language: str) -> str:
-    language = language.lower()
-    language = translate_text("test", language).split()[-1]
-    reader = PyMuPDFReader()
-    docs = reader.load(file_path=filepath)
-    full_text = "\n".join(doc.text for doc in docs)
-    chunks = split_text(full_text)
-    translated_chunks = [GoogleTranslator(target=language).translate(chunk) for chunk in chunks]
+    language = resolve_language(language)
+    if not Path(filepath).exists():
+        return f"❌ File not found: {filepath}"
+    # Pages are streamed and translated a window at a time, so the source is never held whole
+    translated_chunks = []
+    pages = iter_pdf_pages(filepath)
+    while True:
+        window = list(itertools.islice(pages, TRANSLATE_PAGE_WINDOW))
+        if not window:
+            break
+        chunks = split_text("\n".join(window))
+        translated_chunks.extend(translate_segments(chunks, language, first_number=len(translated_chunks) + 1, total="…"))
     return "\n\n".join(translated_chunks)
 
-def answering_text(text: str, question: str, run_classic_prompt=None) -> str:
-    context = "\n\n".join(text.split("\n\n")[:5])
-    prompt = f"""You are a research assistant AI. Based on the context below, provide a helpful and clear answer.
+ANSWER_PROMPT = """You are a research assistant AI. Based on the context below, provide a helpful and clear answer.
 
 Research Context:
 {context}
@@ -42,24 +49,27 @@ User Question:
 {question}
 
 Answer:"""
-    return run_classic_prompt(prompt)
+
+def answering_text(text: str, question: str, run_classic_prompt=None) -> str:
+    context = "\n\n".join(get_text_index(text).select_context(question))
+    prompt = ANSWER_PROMPT.format(context=context, question=question)
+    return (run_classic_prompt or default_classic_prompt)(prompt)
 
 def answering_pdf(filepath: str, question: str, run_classic_prompt=None) -> str:
-    chunks = load_pdf_chunks(filepath)
-    if not chunks or chunks == ["File not found."]:
+    # A question pointing at one section ("what is said in the conclusion?") is answered from that
+    # section only; an empty section falls back to the whole paper
+    structure = preprocessor.result(filepath, "structure", lambda: get_structure(filepath))
+    section = structure.mentioned_in(question) if structure else None
+    section_body = section_text(filepath, section) if section else None
+    if section_body:
+        index = get_text_index(section_body)
+    else:
+        index = preprocessor.result(filepath, "index", lambda: get_pdf_index(filepath))
+    if index is None or not index.passages:
         return "❌ PDF file not found or empty."
-    selected_chunks = chunks[:5]
-    context = "\n\n".join(selected_chunks)
-    prompt = f"""You are a research assistant AI. Based on the context below, provide a helpful and clear answer.
-
-Research Context:
-{context}
-
-User Question:
-{question}
-
-Answer:"""
-    return run_classic_prompt(prompt)
+    context = "\n\n".join(index.select_context(question))
+    prompt = ANSWER_PROMPT.format(context=context, question=question)
+    return (run_classic_prompt or default_classic_prompt)(prompt)
 
 def abstract_from_text(text: str) -> str:
     clean_text = re.sub(r"-\n", "", text)
@@ -68,11 +78,48 @@ def abstract_from_text(text: str) -> str:
     return match.group(1).strip() if match else "⚠️ Abstract section not found."
 
 def abstract_from_pdf(filepath: str) -> str:
-    chunks = load_pdf_chunks(filepath)
-    if not chunks or chunks == ["File not found."]:
+    return preprocessor.result(filepath, "abstract", lambda: _abstract_from_pdf(filepath))
+
+def _abstract_from_pdf(filepath: str) -> str:
+    # The abstract is on the first pages; the rest of the document is never read
+    span = abstract_span(filepath)
+    if span:
+        abstract = read_span(filepath, span["start"], span["end"])
+        abstract = re.sub(r"\s+", " ", re.sub(r"-\n", "", abstract)).strip()
+        if len(abstract) >= 100:
+            return abstract
+    chunks = list(iter_pdf_pages(filepath, 0, ABSTRACT_PAGES))
+    if not chunks:
         return "❌ PDF file not found or empty."
-    full_text = "\n".join(chunks)
-    return abstract_from_text(full_text)
+    return abstract_from_text("\n".join(chunks))
+
+def serpapi_search(params: dict) -> dict:
+    from serpapi import GoogleSearch
+    return GoogleSearch(params).get_dict()
+
+# Swappable with set_search_backend(), e.g. for offline benchmarks
+_search_backend = serpapi_search
+
+def set_search_backend(backend):
+    global _search_backend
+    previous, _search_backend = _search_backend, backend
+    return previous
+
+def _scholar_articles(results: dict) -> list:
+    # Keep structured fields so cached results can be re-ranked or re-formatted offline
+    # SerpAPI reports an empty result page as an error; anything else (quota, bad key) must not be cached
+    if "error" in results and "returned any results" not in results["error"]:
+        raise RuntimeError(f"Search failed: {results['error']}")
+    return [
+        {
+            "title": item.get("title", "❓ No title"),
+            "authors": item.get("publication_info", {}).get("summary", "❓ No author info"),
+            "link": item.get("link", "🔗 No link"),
+            "snippet": item.get("snippet", ""),
+            "cited_by": item.get("inline_links", {}).get("cited_by", {}).get("total"),
+        }
+        for item in results.get("organic_results", [])
+    ]
 
 def search_similar(abstract: str, title: str = "") -> str:
     from os import getenv
@@ -82,32 +129,51 @@ def search_similar(abstract: str, title: str = "") -> str:
         "q": query,
         "api_key": getenv("GOOGLE_SCHOLAR_SEARCH")
     }
-    search = GoogleSearch(params)
-    results = search.get_dict()
-    articles = [
-        {
-            "title": item.get("title", "❓ No title"),
-            "authors": item.get("publication_info", {}).get("summary", "❓ No author info"),
-            "link": item.get("link", "🔗 No link")
-        }
-        for item in results.get("organic_results", [])[:5]
-    ]
+    try:
+        articles = search_cache.lookup(params["engine"], query, lambda: _scholar_articles(_search_backend(params)))[:5]
+    except Exception as e:
+        # A failed search (bad key, quota, network) is reported to the model, not raised into the turn
+        logger.warning(f"⚠️ Similar-paper search failed: {e}")
+        return f"⚠️ Could not search for similar articles: {e}"
     if not articles:
         return "⚠️ No similar articles found."
     return "\n\n".join([f"{i+1}. {a['title']}\n   Authors: {a['authors']}\n   Link: {a['link']}" for i, a in enumerate(articles)])
 
 def summarize_text(text: str) -> str:
-    summarizer = pipeline("summarization", model="sshleifer/distilbart-cnn-12-6", device=-1)
-    return summarizer(text, max_length=512, min_length=30, do_sample=False)[0]['summary_text']
+    return summarize_document([text])
+
+def summarize_pdf(pdf_path: str, section: str = "") -> str:
+    """Summarize a PDF, or only one of its sections when section is given (e.g. "3", "conclusion", "abstract")."""
+    if section:
+        return _summarize_pdf(pdf_path, section)
+    return preprocessor.result(pdf_path, "summary", lambda: _summarize_pdf(pdf_path))
 
-def summarize_pdf(pdf_path: str) -> str:
+def _summarize_pdf(pdf_path: str, section: str = "") -> str:
     if not Path(pdf_path).exists():
         return f"❌ File not found: {pdf_path}"
-    reader = PyMuPDFReader()
-    docs = reader.load(file_path=pdf_path)
-    chunks = [doc.text.strip() for doc in docs if len(doc.text.strip()) > 50]
-    if not chunks:
-        return "❌ No meaningful text found in PDF."
-    summaries = [summarize_text(chunk) for chunk in chunks if len(chunk) > 50]
-    combined = " ".join(summaries)[:1024]
-    return summarize_text(combined)
\ No newline at end of file
+    structure = preprocessor.result(pdf_path, "structure", lambda: get_structure(pdf_path))
+    if section:
+        found = structure.find(section)
+        if found is None:
+            return f"❌ Section '{section}' not found. Sections: {', '.join(section_names(structure)) or 'none detected'}."
+        start, end = found["start"], found["end"]
+    else:
+        # The reference list adds nothing to a summary
+        start, end = [0, 0], structure.body_end()
+    chunks = (page.strip() for page in iter_span(pdf_path, start, end) if len(page.strip()) > 50)
+    return summarize_document(chunks) or "❌ No meaningful text found in PDF."
+
+# === Work done in the background when a PDF is uploaded (see preprocess.py) ===
+_PREPROCESS_FUNCTIONS = {
+    "parse": get_pdf_pages,
+    "structure": get_structure,
+    "abstract": _abstract_from_pdf,
+    "index": get_pdf_index,
+    "summary": _summarize_pdf,
+}
+
+def preprocess_pdf(filepath: str):
+    """Start the background preparation of an uploaded PDF; returns its PreprocessJob."""
+    # Always in dependency order (summary reuses the structure), whatever order the env lists them in
+    steps = [(name, fn) for name, fn in _PREPROCESS_FUNCTIONS.items() if name in PREPROCESS_STEPS]
+    return preprocessor.submit(filepath, steps)
@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# === Logging ===
+# INFO shows one line per step/tool; DEBUG adds full conversation, response and tool-result dumps.
+logger = logging.getLogger("studymate")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    _level = os.getenv("STUDYMATE_LOG_LEVEL", "INFO").strip().upper()
+    if _level not in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"):
+        _handler.stream.write(f"⚠️ Unknown STUDYMATE_LOG_LEVEL '{_level}', using INFO\n")
+        _level = "INFO"
+    logger.setLevel(_level)
+    logger.propagate = False
+
+
+# === Sinks ===
+class JsonlSink:
+    """One flat JSON object per finished span."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpJsonSink(JsonlSink):
+    """
+    One OTLP/JSON ExportTraceServiceRequest per line, the format the OpenTelemetry collector's
+    file receiver (and otlp-json tooling) reads.
+    """
+
+    def export(self, span):
+        record = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "studymate"}}]},
+                "scopeSpans": [{
+                    "scope": {"name": "studymate"},
+                    "spans": [{
+                        "traceId": span.trace_id,
+                        "spanId": span.span_id,
+                        "parentSpanId": span.parent_id or "",
+                        "name": span.name,
+                        "kind": 1,
+                        "startTimeUnixNano": str(span.start_ns),
+                        "endTimeUnixNano": str(span.end_ns),
+                        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+                        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+                    }],
+                }],
+            }]
+        }
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+
+# === Spans ===
+class Span:
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+        self._start = time.perf_counter()
+        self.duration_ms = None
+
+    def set(self, **attributes):
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    def add(self, **counters):
+        for key, value in counters.items():
+            if value is not None:
+                self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def end(self):
+        self.end_ns = time.time_ns()
+        self.duration_ms = round((time.perf_counter() - self._start) * 1000, 3)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class Tracer:
+    def __init__(self):
+        self.sinks = []
+        self._current = contextvars.ContextVar("current_span", default=None)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def current_span(self):
+        return self._current.get()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        parent = self._current.get()
+        span = Span(name, parent, attributes)
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._current.reset(token)
+            span.end()
+            logger.debug("⏱️ %s %sms %s", name, span.duration_ms, span.attributes)
+            for sink in self.sinks:
+                try:
+                    sink.export(span)
+                except OSError as e:
+                    logger.warning(f"⚠️ Could not export span {name}: {e}")
+
+
+tracer = Tracer()
+
+_trace_file = os.getenv("STUDYMATE_TRACE_FILE")
+if _trace_file:
+    _format = os.getenv("STUDYMATE_TRACE_FORMAT", "jsonl").lower()
+    tracer.add_sink(OtlpJsonSink(_trace_file) if _format == "otlp" else JsonlSink(_trace_file))
+
+
+def span(name, **attributes):
+    return tracer.span(name, **attributes)
+
+
+def record_usage(target_span, usage):
+    """Copy Mistral token counts onto a span and add them to the enclosing agent run."""
+    if usage is None:
+        return
+    counts = {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        "total_tokens": getattr(usage, "total_tokens", None),
+    }
+    target_span.set(**counts)
+    root = target_span.parent
+    while root is not None and root.name != "agent.run":
+        root = root.parent
+    if root is not None:
+        root.add(**counts)
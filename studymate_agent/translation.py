@@ -0,0 +1,162 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from utils import emit_progress
+
+langs = {'afrikaans': 'af', 'albanian': 'sq', 'amharic': 'am', 'arabic': 'ar', 'armenian': 'hy', 'assamese': 'as', 'aymara': 'ay', 'azerbaijani': 'az', 'bambara': 'bm', 'basque': 'eu', 'belarusian': 'be', 'bengali': 'bn', 'bhojpuri': 'bho', 'bosnian': 'bs', 'bulgarian': 'bg', 'catalan': 'ca', 'cebuano': 'ceb', 'chichewa': 'ny', 'chinese (simplified)': 'zh-CN', 'chinese (traditional)': 'zh-TW', 'corsican': 'co', 'croatian': 'hr', 'czech': 'cs', 'danish': 'da', 'dhivehi': 'dv', 'dogri': 'doi', 'dutch': 'nl', 'english': 'en', 'esperanto': 'eo', 'estonian': 'et', 'ewe': 'ee', 'filipino': 'tl', 'finnish': 'fi', 'french': 'fr', 'frisian': 'fy', 'galician': 'gl', 'georgian': 'ka', 'german': 'de', 'greek': 'el', 'guarani': 'gn', 'gujarati': 'gu', 'haitian creole': 'ht', 'hausa': 'ha', 'hawaiian': 'haw', 'hebrew': 'iw', 'hindi': 'hi', 'hmong': 'hmn', 'hungarian': 'hu', 'icelandic': 'is', 'igbo': 'ig', 'ilocano': 'ilo', 'indonesian': 'id', 'irish': 'ga', 'italian': 'it', 'japanese': 'ja', 'javanese': 'jw', 'kannada': 'kn', 'kazakh': 'kk', 'khmer': 'km', 'kinyarwanda': 'rw', 'konkani': 'gom', 'korean': 'ko', 'krio': 'kri', 'kurdish (kurmanji)': 'ku', 'kurdish (sorani)': 'ckb', 'kyrgyz': 'ky', 'lao': 'lo', 'latin': 'la', 'latvian': 'lv', 'lingala': 'ln', 'lithuanian': 'lt', 'luganda': 'lg', 'luxembourgish': 'lb', 'macedonian': 'mk', 'maithili': 'mai', 'malagasy': 'mg', 'malay': 'ms', 'malayalam': 'ml', 'maltese': 'mt', 'maori': 'mi', 'marathi': 'mr', 'meiteilon (manipuri)': 'mni-Mtei', 'mizo': 'lus', 'mongolian': 'mn', 'myanmar': 'my', 'nepali': 'ne', 'norwegian': 'no', 'odia (oriya)': 'or', 'oromo': 'om', 'pashto': 'ps', 'persian': 'fa', 'polish': 'pl', 'portuguese': 'pt', 'punjabi': 'pa', 'quechua': 'qu', 'romanian': 'ro', 'russian': 'ru', 'samoan': 'sm', 'sanskrit': 'sa', 'scots gaelic': 'gd', 'sepedi': 'nso', 'serbian': 'sr', 'sesotho': 'st', 'shona': 'sn', 'sindhi': 'sd', 'sinhala': 'si', 'slovak': 'sk', 'slovenian': 'sl', 'somali': 'so', 'spanish': 'es', 'sundanese': 'su', 'swahili': 'sw', 'swedish': 'sv', 'tajik': 'tg', 'tamil': 'ta', 'tatar': 'tt', 'telugu': 'te', 'thai': 'th', 'tigrinya': 'ti', 'tsonga': 'ts', 'turkish': 'tr', 'turkmen': 'tk', 'twi': 'ak', 'ukrainian': 'uk', 'urdu': 'ur', 'uyghur': 'ug', 'uzbek': 'uz', 'vietnamese': 'vi', 'welsh': 'cy', 'xhosa': 'xh', 'yiddish': 'yi', 'yoruba': 'yo', 'zulu': 'zu'}
+
+TRANSLATE_WORKERS = int(os.getenv("STUDYMATE_TRANSLATE_WORKERS", "4"))
+TRANSLATION_CACHE_SIZE = int(os.getenv("STUDYMATE_TRANSLATION_CACHE_SIZE", "4096"))
+
+_codes = {code.lower(): code for code in langs.values()}
+
+
+def resolve_language(language: str) -> str:
+    """Map a language name ("German") or code ("de", "zh-cn") to the translator code, without a network call."""
+    language = language.strip().lower()
+    if language in langs:
+        return langs[language]
+    return _codes.get(language, language)
+
+
+# === Pluggable translator backend ===
+_local = threading.local()
+
+
+def google_translator_backend(text: str, target: str) -> str:
+    from deep_translator import GoogleTranslator
+    # One translator per (thread, language): GoogleTranslator holds a session and is not shared across threads
+    translators = getattr(_local, "translators", None)
+    if translators is None:
+        translators = _local.translators = {}
+    if target not in translators:
+        translators[target] = GoogleTranslator(target=target)
+    return translators[target].translate(text)
+
+
+_backend = google_translator_backend
+
+
+def set_translator_backend(backend):
+    """Swap the function used as backend(text, target_code) -> str. Returns the previous backend."""
+    global _backend
+    previous, _backend = _backend, backend
+    return previous
+
+
+def get_translator_backend():
+    return _backend
+
+
+# === Per-segment translation cache ===
+class TranslationCache:
+    """
+    LRU of translated segments keyed by (sha256(segment), target language).
+    With cache_dir set, entries are also kept on disk as <target>/<hash>.txt.
+    """
+
+    def __init__(self, max_entries=4096, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(segment, target):
+        return hashlib.sha256(segment.encode("utf-8")).hexdigest(), target
+
+    def get(self, segment, target):
+        key = self.key(segment, target)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        if self.cache_dir:
+            path = self.cache_dir / key[1] / f"{key[0]}.txt"
+            if path.exists():
+                translated = path.read_text(encoding="utf-8")
+                self._remember(key, translated)
+                with self._lock:
+                    self.hits += 1
+                return translated
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, segment, target, translated):
+        key = self.key(segment, target)
+        self._remember(key, translated)
+        if self.cache_dir:
+            folder = self.cache_dir / key[1]
+            folder.mkdir(parents=True, exist_ok=True)
+            tmp_path = folder / f"{key[0]}.{threading.get_ident()}.tmp"
+            tmp_path.write_text(translated, encoding="utf-8")
+            os.replace(tmp_path, folder / f"{key[0]}.txt")
+
+    def _remember(self, key, translated):
+        with self._lock:
+            self._entries[key] = translated
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+translation_cache = TranslationCache(
+    max_entries=TRANSLATION_CACHE_SIZE,
+    cache_dir=os.getenv("STUDYMATE_TRANSLATION_CACHE_DIR") or None,
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=TRANSLATE_WORKERS, thread_name_prefix="translate")
+        return _executor
+
+
+def _translate_segment(segment, target):
+    if not segment.strip():
+        return segment
+    cached = translation_cache.get(segment, target)
+    if cached is not None:
+        return cached
+    translated = _backend(segment, target)
+    if translated is None:
+        translated = ""
+    translation_cache.put(segment, target, translated)
+    return translated
+
+
+def translate_segments(segments, target: str, first_number=1, total=None) -> list:
+    """
+    Translate segments on the shared worker pool; results come back in the original order.
+    Each translated segment is also reported through emit_progress as soon as it is next in order
+    (numbered from first_number, out of total when the caller streams a larger document).
+    """
+    segments = list(segments)
+    if len(segments) <= 1:
+        results = (_translate_segment(segment, target) for segment in segments)
+    else:
+        results = _get_executor().map(lambda segment: _translate_segment(segment, target), segments)
+
+    total = total or len(segments)
+    translated = []
+    for result in results:
+        translated.append(result)
+        if total != 1:
+            emit_progress(f"[{first_number + len(translated) - 1}/{total}] {result}")
+    return translated
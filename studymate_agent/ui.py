@@ -1,22 +1,36 @@
 import gradio as gr
-import tempfile
-from agent_loop import agent_loop
+import hashlib
+from agent_loop import stream_agent_loop, CPU_TOOL_QUEUE
 from tools import (
     translate_text, translate_pdf, answering_text, answering_pdf,
     abstract_from_text, abstract_from_pdf, search_similar,
-    summarize_text, summarize_pdf
+    summarize_text, summarize_pdf, preprocess_pdf
 )
-from utils import build_function_map_with_partial, build_tool_schema
+from utils import build_function_map_with_partial, build_tool_schema, message_content, compact_history
+from artifacts import attach_artifacts
+from model_registry import warmup_from_env
+from mistral_gateway import get_mistral_client
+from preprocess import preprocessor
+from tracing import logger
 import os
 
-# === Shared PDF context and conversation history ===
-pdf_context = {
-    "filepath": None,
-    "history": []
-}
-
 system_prompt = "You are StudyMate, an assistant that helps students understand academic papers by summarizing, translating, and answering questions."
 
+# Chat turns handled at once. A turn waiting for a model-heavy tool keeps its slot, so the agent
+# loop admits at most CPU_TOOL_QUEUE such calls (the rest are told to retry): as long as that is
+# below CHAT_CONCURRENCY, light requests (translation, search, plain chat) keep flowing while
+# summaries run.
+CHAT_CONCURRENCY = int(os.getenv("STUDYMATE_CHAT_CONCURRENCY", "16"))
+if CPU_TOOL_QUEUE >= CHAT_CONCURRENCY:
+    logger.warning(
+        f"⚠️ STUDYMATE_CPU_TOOL_QUEUE ({CPU_TOOL_QUEUE}) >= STUDYMATE_CHAT_CONCURRENCY ({CHAT_CONCURRENCY}): "
+        "waiting summaries can take every chat slot"
+    )
+UPLOAD_CONCURRENCY = int(os.getenv("STUDYMATE_UPLOAD_CONCURRENCY", "4"))
+QUEUE_MAX_SIZE = int(os.getenv("STUDYMATE_QUEUE_MAX_SIZE", "128"))
+# Estimated Mistral tokens of earlier turns carried into the next one
+HISTORY_TOKEN_BUDGET = int(os.getenv("STUDYMATE_HISTORY_TOKENS", "2000"))
+
 # === Register tools and build schemas ===
 tools = [
     translate_text, translate_pdf, answering_text, answering_pdf,
@@ -26,71 +40,147 @@ tools = [
 mistral_tool_definitions = [build_tool_schema(fn) for fn in tools]
 names_to_functions = build_function_map_with_partial(tools)
 
-# === Handle PDF upload and store its temporary path ===
-def process_pdf(file):
+
+# === Per-session PDF context and conversation history ===
+def new_session():
+    return {
+        "filepath": None,
+        "history": [{"role": "system", "content": system_prompt}]
+    }
+
+
+# === Handle PDF upload and store it under a content-hashed path ===
+def process_pdf(file, session):
     """
-    Save the uploaded PDF to a known location with readable name,
-    and reset conversation context.
+    Save the uploaded PDF under pdfs/<content hash>.pdf and reset this session's conversation.
+    Identical uploads from different users share one file.
     """
     try:
-        filename = "uploaded_paper.pdf"
+        if file is None:
+            return "⚠️ Please choose a PDF first.", gr.Timer(active=False), session
+
+        digest = hashlib.sha256(file).hexdigest()[:24]
         pdf_dir = os.path.join(os.getcwd(), "pdfs")
         os.makedirs(pdf_dir, exist_ok=True)
-        full_path = os.path.join(pdf_dir, filename)
+        full_path = os.path.join(pdf_dir, f"{digest}.pdf")
+
+        if not os.path.exists(full_path):
+            tmp_path = f"{full_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(file)
+            os.replace(tmp_path, full_path)
 
-        with open(full_path, "wb") as f:
-            f.write(file)
+        session = new_session()
+        session["filepath"] = full_path
 
-        # Set context
-        pdf_context["filepath"] = full_path
-        pdf_context["history"] = [{"role": "system", "content": system_prompt}]
+        # Parse, index and summarize in the background; the chat tools pick up the results
+        preprocess_pdf(full_path)
 
-        print(f"pdf_context: \n{pdf_context}")
-        return "✅ PDF uploaded and ready for questions like 'summarize', 'translate', or 'find similar articles'."
+        logger.debug("session: \n%s", session)
+        # The status timer polls the job until it is done
+        return *upload_status(session), session
 
     except Exception as e:
-        return f"❌ Error: {str(e)}"
+        return f"❌ Error: {str(e)}", gr.Timer(active=False), session
+
 
+READY_MESSAGE = "✅ PDF uploaded and ready for questions like 'summarize', 'translate', or 'find similar articles'."
 
-# === Chat interaction handler with persistent conversation ===
-def chat_with_agent(history, user_input):
+
+def upload_status(session):
+    """
+    Status box text with the background preprocessing progress of this session's PDF, and the
+    status timer: it keeps ticking only while the job is running.
+    """
+    job = preprocessor.job_for(session["filepath"]) if session else None
+    if job is None:
+        return (READY_MESSAGE if session and session["filepath"] else gr.skip()), gr.Timer(active=False)
+    if job.done():
+        return f"{READY_MESSAGE}\n{job.describe()}", gr.Timer(active=False)
+    return f"⏳ Preparing your PDF — you can already ask questions.\n{job.describe()}", gr.Timer(active=True)
+
+
+# === Chat interaction handler with per-session conversation ===
+PROGRESS_PREVIEW_CHARS = 1500
+
+
+def _render_progress(progress, chunk_count=0, latest_chunk=""):
+    """
+    Tool status lines plus only the latest partial output: every event re-sends the whole
+    message, so the partial outputs of a long translation are not accumulated here (the reply
+    attaches the full result).
+    """
+    if not progress:
+        return "⏳ Thinking..."
+    lines = list(progress)
+    if chunk_count:
+        preview = latest_chunk if len(latest_chunk) <= PROGRESS_PREVIEW_CHARS else latest_chunk[:PROGRESS_PREVIEW_CHARS] + " …"
+        lines.append(f"📝 Partial output {chunk_count}:\n{preview}")
+    return "\n\n".join(lines)
+
+
+def chat_with_agent(history, user_input, session):
     """
     Process user input, attach PDF path if needed, run agent, and maintain trimmed conversation.
+    This is a generator: tool progress, partial tool output and the reply tokens are rendered
+    as they arrive.
     """
+    session = session or new_session()
+    history = history + [
+        {"role": "user", "content": user_input},
+        {"role": "assistant", "content": "⏳ Thinking..."},
+    ]
+    yield history, history, session
+
     try:
         # Internally add path to prompt if needed, without exposing it to user
         injected_input = user_input
-        if pdf_context["filepath"] and "pdf_path" not in user_input and "pdfs/" not in user_input:
-            injected_input += f'\nThe file is called "{pdf_context["filepath"]}".'
+        if session["filepath"] and "pdf_path" not in user_input and "pdfs/" not in user_input:
+            injected_input += f'\nThe file is called "{session["filepath"]}".'
 
-        # Limit history to last 2 exchanges
-        trimmed_history = pdf_context["history"][-5:]  # include system + 2 rounds (user+assistant)
+        # Carry as many recent turns as fit the history budget
+        trimmed_history = compact_history(session["history"], HISTORY_TOKEN_BUDGET)
         conversation = trimmed_history + [{"role": "user", "content": injected_input}]
         MAX_TOKENS = 512
 
-        from mistralai import Mistral
-        api_key = os.getenv("MISTRAL_API_KEY")
         model = "mistral-large-latest"
-        client = Mistral(api_key=api_key)
+        client = get_mistral_client()
 
-        final_conversation = agent_loop(
+        progress = []
+        chunk_count, latest_chunk = 0, ""
+        streamed_reply = ""
+        final_conversation = None
+        for event in stream_agent_loop(
             conversation, mistral_tool_definitions, MAX_TOKENS, names_to_functions, client=client, model=model
-        )
-        reply = final_conversation[-1].content
-
-        # Save only the last 2 exchanges in history (excluding system message)
-        pdf_context["history"] = (
-            [h for h in pdf_context["history"] if h["role"] == "system"] +
-            final_conversation[-4:]  # 2 rounds (user+assistant)
-        )
+        ):
+            kind = event["type"]
+            if kind == "step":
+                streamed_reply = ""
+            elif kind == "tool_start":
+                progress.append(f"🛠️ Running `{event['name']}`...")
+            elif kind == "tool_chunk":
+                chunk_count += 1
+                latest_chunk = event["text"]
+            elif kind == "tool_end":
+                progress.append(f"✅ `{event['name']}` finished.")
+            elif kind == "token":
+                streamed_reply += event["text"]
+            elif kind == "final":
+                final_conversation = event["conversation"]
+                continue
+            history[-1] = {"role": "assistant", "content": streamed_reply or _render_progress(progress, chunk_count, latest_chunk)}
+            yield history, history, session
+
+        # Full artifacts are shown to the user; the history keeps only their handles and previews
+        reply = attach_artifacts(message_content(final_conversation[-1]), final_conversation)
+        session["history"] = compact_history(final_conversation, HISTORY_TOKEN_BUDGET)
 
     except Exception as e:
         reply = f"❌ Error: {str(e)}"
 
     # Update visible chat history
-    history.append({"role": "user", "content": user_input})
-    history.append({"role": "assistant", "content": reply})
-    return history, history
+    history[-1] = {"role": "assistant", "content": reply}
+    yield history, history, session
 
 
 
@@ -103,15 +193,33 @@ with gr.Blocks() as demo:
         output = gr.Textbox(label="Status", interactive=False)
 
     upload_btn = gr.Button("Process PDF")
+    status_timer = gr.Timer(1.0, active=False)
     chatbot = gr.Chatbot(type="messages")
     state = gr.State([])
+    session_state = gr.State(new_session)
 
     with gr.Row():
         msg = gr.Textbox(show_label=False, placeholder="Ask something like: 'summarize this', 'translate to German', or 'find similar papers'...")
         send = gr.Button("Send")
 
-    upload_btn.click(process_pdf, inputs=file, outputs=output)
-    send.click(chat_with_agent, inputs=[state, msg], outputs=[chatbot, state])
-    msg.submit(chat_with_agent, inputs=[state, msg], outputs=[chatbot, state])
-
-demo.launch(share=True)
\ No newline at end of file
+    upload_btn.click(
+        process_pdf, inputs=[file, session_state], outputs=[output, status_timer, session_state],
+        concurrency_limit=UPLOAD_CONCURRENCY, concurrency_id="upload"
+    )
+    status_timer.tick(upload_status, inputs=[session_state], outputs=[output, status_timer], show_progress="hidden")
+    send.click(
+        chat_with_agent, inputs=[state, msg, session_state], outputs=[chatbot, state, session_state],
+        concurrency_limit=CHAT_CONCURRENCY, concurrency_id="chat"
+    )
+    msg.submit(
+        chat_with_agent, inputs=[state, msg, session_state], outputs=[chatbot, state, session_state],
+        concurrency_limit=CHAT_CONCURRENCY, concurrency_id="chat"
+    )
+
+demo.queue(max_size=QUEUE_MAX_SIZE)
+
+if __name__ == "__main__":
+    for name, info in warmup_from_env().items():
+        print(f"🔥 {name}: {info}")
+
+    demo.launch(share=True)
@@ -4,10 +4,10 @@ import json
 import random
 import inspect
 import functools
-import time
-from pathlib import Path
-from llama_index.readers.file import PyMuPDFReader
-from mistralai.models import SDKError
+import contextvars
+from contextlib import contextmanager
+from mistral_gateway import gateway
+from doc_store import get_pdf_pages
 
 
 def run_model(conversation, tools, tool_choice="any", parallel_tool_calls=False, client=None, model=None):
@@ -20,14 +20,42 @@ def run_model(conversation, tools, tool_choice="any", parallel_tool_calls=False,
     )
 
 def load_pdf_chunks(file_path: str) -> list:
-    if not Path(file_path).exists():
+    pages = get_pdf_pages(file_path)
+    if pages is None:
         return ["File not found."]
-    reader = PyMuPDFReader()
-    docs = reader.load(file_path=file_path)
-    return [doc.text for doc in docs]
+    return list(pages)
 
 def split_text(text, max_length=4500):
-    return textwrap.wrap(text, max_length)
+    """
+    Split text into segments of at most max_length characters, breaking on paragraph
+    boundaries first, then sentence boundaries, and only then between words.
+    """
+    segments = []
+    current = ""
+
+    def add(unit, separator):
+        nonlocal current
+        if current and len(current) + len(separator) + len(unit) > max_length:
+            segments.append(current)
+            current = ""
+        current = current + separator + unit if current else unit
+
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_length:
+            add(paragraph, "\n\n")
+            continue
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            if len(sentence) <= max_length:
+                add(sentence, " ")
+            else:
+                for piece in textwrap.wrap(sentence, max_length):
+                    add(piece, " ")
+    if current:
+        segments.append(current)
+    return segments
 
 def extract_tool_calls(decoded: str):
     matches = re.findall(r'\[\s*{.*?}\s*}\s*\]', decoded, re.DOTALL)
@@ -79,18 +107,87 @@ def build_function_map_with_partial(tools, **shared_kwargs):
     }
 
 def safe_complete_call(client, **kwargs):
-    retries = 3
-    delay = 2
-    for attempt in range(retries):
-        try:
-            return client.chat.complete(**kwargs)
-        except SDKError as e:
-            if e.status_code == 429:
-                print(f"⚠️ Capacity error (429). Retry {attempt + 1}/{retries} in {delay}s...")
-                time.sleep(delay)
-            else:
-                raise
-    raise RuntimeError("❌ Failed after 3 retries due to service capacity limits.")
+    return gateway.complete(client, **kwargs)
+
+async def safe_complete_call_async(client, **kwargs):
+    return await gateway.complete_async(client, **kwargs)
+
+def safe_stream_call_async(client, **kwargs):
+    return gateway.stream_async(client, **kwargs)
+
+# === Progress reporting from inside tools ===
+# Long-running tools call emit_progress() with partial output; whoever runs the tool decides where it goes.
+_progress_sink = contextvars.ContextVar("progress_sink", default=None)
+
+@contextmanager
+def progress_sink(callback):
+    token = _progress_sink.set(callback)
+    try:
+        yield
+    finally:
+        _progress_sink.reset(token)
+
+def emit_progress(text):
+    callback = _progress_sink.get()
+    if callback is not None:
+        callback(text)
+
+def message_role(message):
+    # Conversations mix plain dicts with Mistral SDK message objects
+    return message["role"] if isinstance(message, dict) else message.role
+
+def message_content(message):
+    return message["content"] if isinstance(message, dict) else message.content
+
+def message_tool_calls(message):
+    calls = message.get("tool_calls") if isinstance(message, dict) else getattr(message, "tool_calls", None)
+    return calls or []
 
 def get_final_answer(final_conversation):
-    return final_conversation[-1].content
\ No newline at end of file
+    return message_content(final_conversation[-1])
+
+def estimate_message_tokens(message):
+    # ~4 characters per token, the same estimate the Mistral gateway uses for rate limiting
+    content = message_content(message)
+    size = len(content) if isinstance(content, str) else len(json.dumps(content, default=str))
+    for call in message_tool_calls(message):
+        size += len(str(call.function.arguments)) if hasattr(call, "function") else len(json.dumps(call, default=str))
+    return size // 4 + 4
+
+def compact_history(messages, token_budget):
+    """
+    Keep the system messages and as many of the most recent turns as fit in token_budget.
+
+    A turn is a user message with everything the agent appended after it (tool calls, tool
+    results, the reply), so tool messages are never separated from the call that produced them.
+    A recent turn too large to keep whole is reduced to its user message and final reply.
+    """
+    system = [m for m in messages if message_role(m) == "system"]
+    turns = []
+    for message in messages:
+        role = message_role(message)
+        if role == "system":
+            continue
+        if role == "user" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+
+    def reply_only(turn):
+        # A turn cut short (repeated call, round limit) ends in unanswered tool calls; keep just the question
+        last = turn[-1]
+        return turn[:1] + ([last] if len(turn) > 1 and message_role(last) == "assistant" and not message_tool_calls(last) else [])
+
+    budget = token_budget - sum(estimate_message_tokens(m) for m in system)
+    kept = []
+    for turn in reversed(turns):
+        if message_tool_calls(turn[-1]):
+            turn = reply_only(turn)
+        cost = sum(estimate_message_tokens(m) for m in turn)
+        if cost > budget and len(turn) > 2:
+            turn = reply_only(turn)
+            cost = sum(estimate_message_tokens(m) for m in turn)
+        if cost > budget:
+            break
+        kept[:0] = turn
+        budget -= cost
+    return system + kept
\ No newline at end of file
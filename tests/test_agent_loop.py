@@ -0,0 +1,72 @@
+import os
+import sys
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "studymate_agent"))
+
+from mistralai import Mistral  # noqa: E402
+from agent_loop import agent_loop, stream_agent_loop  # noqa: E402
+
+
+def _completion(text):
+    return {
+        "id": "cmpl-test",
+        "object": "chat.completion",
+        "model": "fake-mistral",
+        "created": 0,
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+    }
+
+
+class FakeMistralHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keep-alive, so the client reuses its pooled connection across turns
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if request.get("stream"):
+            chunk = dict(_completion("hi"), object="chat.completion.chunk")
+            chunk["choices"] = [{"index": 0, "finish_reason": "stop", "delta": {"role": "assistant", "content": "hi"}}]
+            body = f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n".encode()
+            content_type = "text/event-stream"
+        else:
+            body = json.dumps(_completion("hi")).encode()
+            content_type = "application/json"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture(scope="module")
+def client():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeMistralHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield Mistral(api_key="test", server_url=f"http://127.0.0.1:{server.server_address[1]}")
+    server.shutdown()
+
+
+def _turn(text):
+    return [{"role": "user", "content": text}]
+
+
+def test_consecutive_turns_share_one_client(client):
+    for text in ("Hello", "And again"):
+        conversation = agent_loop(_turn(text), [], 2, {}, client=client, model="fake-mistral")
+        assert conversation[-1].content == "hi"
+
+
+def test_consecutive_streamed_turns_share_one_client(client):
+    for text in ("Hello", "And again"):
+        events = list(stream_agent_loop(_turn(text), [], 2, {}, client=client, model="fake-mistral"))
+        assert events[-1]["type"] == "final"
+        assert events[-1]["conversation"][-1].content == "hi"
@@ -0,0 +1,74 @@
+import os
+import sys
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "studymate_agent"))
+
+from mistral_gateway import MistralGateway  # noqa: E402
+
+
+class FailingChat:
+    async def stream_async(self, **kwargs):
+        raise ConnectionError("connect timeout")
+
+    async def complete_async(self, **kwargs):
+        raise ConnectionError("connect timeout")
+
+
+async def _consume(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_failed_stream_opens_release_their_slot():
+    gateway = MistralGateway(requests_per_second=0, tokens_per_minute=0, max_in_flight=2)
+    client = SimpleNamespace(chat=FailingChat())
+
+    async def run():
+        for _ in range(3):
+            with pytest.raises(ConnectionError):
+                await asyncio.wait_for(_consume(gateway.stream_async(client, model="m", messages=[])), timeout=2)
+    asyncio.run(run())
+
+
+class CountingChat:
+    def __init__(self):
+        self.calls = []
+
+    async def complete_async(self, **kwargs):
+        self.calls.append(kwargs)
+        return "hi"
+
+
+def test_cache_only_serves_explicit_temperature_zero():
+    gateway = MistralGateway(requests_per_second=0, tokens_per_minute=0, cache_size=8)
+    chat = CountingChat()
+    client = SimpleNamespace(chat=chat)
+
+    async def run():
+        for _ in range(2):
+            await gateway.complete_async(client, model="m", messages=[])
+            await gateway.complete_async(client, model="m", messages=[], temperature=0)
+    asyncio.run(run())
+    assert len(chat.calls) == 3
+    assert "temperature" not in chat.calls[0]
+
+
+def test_waiting_for_a_slot_is_awaitable_and_cancellable():
+    gateway = MistralGateway(requests_per_second=0, tokens_per_minute=0, max_in_flight=1)
+
+    async def run():
+        await gateway._acquire_slot()
+        waiter = asyncio.create_task(gateway._acquire_slot())
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        gateway.in_flight.release()
+        # The cancelled waiter's slot comes back, so a new caller still gets one
+        await asyncio.wait_for(gateway._acquire_slot(), timeout=2)
+        gateway.in_flight.release()
+    asyncio.run(run())
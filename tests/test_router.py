@@ -0,0 +1,53 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "studymate_agent"))
+
+from router import FromTool, route  # noqa: E402
+
+TOOLS = {
+    name: None for name in (
+        "summarize_pdf", "summarize_text", "abstract_from_pdf", "translate_pdf",
+        "translate_text", "search_similar", "answering_pdf",
+    )
+}
+
+
+@pytest.mark.parametrize("text", [
+    "Translate the abstract of the PDF pdfs/paper.pdf into Spanish",
+    "Translate section 3 of pdfs/paper.pdf into German",
+    "Translate the conclusion of pdfs/paper.pdf into French",
+    "Summarize pdfs/paper.pdf in Spanish",
+    "Does pdfs/paper.pdf have a summary table?",
+    "What does the summary in pdfs/paper.pdf say about latency?",
+    "Summarize the paper and translate the summary into French. pdfs/paper.pdf",
+    "Is there related work in pdfs/paper.pdf on similar papers?",
+])
+def test_qualified_or_mixed_requests_go_to_the_model(text):
+    assert route(text, TOOLS) is None
+
+
+@pytest.mark.parametrize("text, tool, params", [
+    ("Summarize pdfs/paper.pdf", "summarize_pdf", {"pdf_path": "pdfs/paper.pdf"}),
+    ("Could you summarize pdfs/paper.pdf?", "summarize_pdf", {"pdf_path": "pdfs/paper.pdf"}),
+    ("Summarize section 3 of pdfs/paper.pdf", "summarize_pdf", {"pdf_path": "pdfs/paper.pdf", "section": "3"}),
+    ("Give me the abstract of pdfs/paper.pdf", "abstract_from_pdf", {"filepath": "pdfs/paper.pdf"}),
+    ("Translate pdfs/paper.pdf into german", "translate_pdf", {"filepath": "pdfs/paper.pdf", "language": "german"}),
+    ('Translate "good morning" to french', "translate_text", {"text": "good morning", "language": "french"}),
+])
+def test_single_intent_requests_are_routed(text, tool, params):
+    routed = route(text, TOOLS)
+    assert routed is not None and routed.tool == tool and routed.params == params
+
+
+def test_similar_papers_take_the_abstract_from_the_pdf():
+    routed = route('Find similar papers. The file is called "pdfs/paper.pdf".', TOOLS)
+    assert routed.tool == "search_similar"
+    source = routed.params["abstract"]
+    assert isinstance(source, FromTool) and source.tool == "abstract_from_pdf"
+
+
+def test_unavailable_tools_are_not_routed():
+    assert route("Summarize pdfs/paper.pdf", {"answering_pdf": None}) is None